@@ -0,0 +1,263 @@
+import collections
+import multiprocessing
+import numpy as np
+
+from learnz.ai.viterbi import viterbi_dense
+
+
+class HMM:
+    """
+    A hidden Markov model trained by counting the transitions and emissions of
+    a tagged corpus.
+
+    States and words are encoded as integers, and counts are kept in dense
+    arrays. Words outside of the vocabulary share one unknown word column, so
+    building the vocabulary with a minimum count gives unknown words the
+    emission counts of rare words.
+
+    Models with the same states and vocabulary can be trained on separate parts
+    of a corpus and merged.
+    """
+
+    def __init__(self, states, vocabulary, *, smoothing = 1.0):
+        """
+        :param states: the hidden states, such as part of speech tags
+        :param vocabulary: the known words
+        :param smoothing: the pseudo count added to every transition and emission (default 1.0)
+        """
+
+        self.states = list(states)
+        self.vocabulary = list(vocabulary)
+        self.smoothing = smoothing
+
+        self._state_indices = {state: index for index, state in enumerate(self.states)}
+        self._word_indices = {word: index for index, word in enumerate(self.vocabulary)}
+
+        # the last word index is the unknown word, and the last transition row
+        # is the start of a sentence
+        self.unknown_index = len(self.vocabulary)
+
+        self.transition_counts = np.zeros((len(self.states) + 1, len(self.states)), dtype = np.int64)
+        self.emission_counts = np.zeros((len(self.states), len(self.vocabulary) + 1), dtype = np.int64)
+
+    def encode_words(self, words):
+        """
+        Encodes words as vocabulary indices.
+
+        :param words: the words to encode
+
+        :return: an array of word indices, using the unknown index for unknown words
+        """
+
+        return np.array([self._word_indices.get(word, self.unknown_index) for word in words], dtype = np.int64)
+
+    def encode(self, tagged_sentences):
+        """
+        Encodes tagged sentences as flat arrays.
+
+        :param tagged_sentences: sentences of (word, state) pairs
+
+        :return: the state index of every word
+        :return: the word index of every word
+        :return: the length of every sentence
+        """
+
+        lengths = np.array([len(sentence) for sentence in tagged_sentences], dtype = np.int64)
+
+        states = np.array([self._state_indices[state] for sentence in tagged_sentences for _, state in sentence],
+                          dtype = np.int64)
+        words = self.encode_words([word for sentence in tagged_sentences for word, _ in sentence])
+
+        return states, words, lengths
+
+    def count(self, states, words, lengths):
+        """
+        Counts the transitions and emissions of encoded sentences.
+
+        Each kind of count is found with a single bincount over the whole
+        corpus.
+
+        :param states: the state index of every word
+        :param words: the word index of every word
+        :param lengths: the length of every sentence
+        """
+
+        state_count = len(self.states)
+        lengths = np.asarray(lengths)
+
+        if np.sum(lengths) != len(states) or len(states) != len(words):
+            raise Exception("The states, words and sentence lengths do not match")
+
+        # every word follows the word before it, except the first word of each
+        # sentence, which follows the start
+        previous_states = np.empty_like(states)
+        previous_states[1:] = states[:-1]
+
+        sentence_starts = (np.cumsum(lengths) - lengths)[lengths > 0]
+        previous_states[sentence_starts] = state_count
+
+        transitions = np.bincount(previous_states * state_count + states, minlength = self.transition_counts.size)
+        emissions = np.bincount(states * self.emission_counts.shape[1] + words, minlength = self.emission_counts.size)
+
+        self.transition_counts += transitions.reshape(self.transition_counts.shape)
+        self.emission_counts += emissions.reshape(self.emission_counts.shape)
+
+    def add(self, tagged_sentences):
+        """
+        Counts the transitions and emissions of tagged sentences.
+
+        :param tagged_sentences: sentences of (word, state) pairs
+        """
+
+        self.count(*self.encode(tagged_sentences))
+
+    def merge(self, other):
+        """
+        Adds the counts of another model with the same states and vocabulary.
+
+        :param other: the model to merge
+        """
+
+        if other.states != self.states or other.vocabulary != self.vocabulary:
+            raise Exception("Only models with the same states and vocabulary can be merged")
+
+        self.transition_counts += other.transition_counts
+        self.emission_counts += other.emission_counts
+
+    def log_probabilities(self):
+        """
+        Gets the smoothed probabilities of the model in log space.
+
+        :return: the log probability of starting in each state
+        :return: a (states x states) matrix of the log probability of moving from each state to each state
+        :return: a (states x words) matrix of the log probability of each state emitting each word, with the
+                 unknown word last
+        """
+
+        transitions = _normalize(self.transition_counts, self.smoothing)
+        emissions = _normalize(self.emission_counts, self.smoothing)
+
+        # states and words that were never seen have a probability of zero
+        # without smoothing
+        with np.errstate(divide = "ignore"):
+            log_transitions = np.log(transitions)
+            log_emissions = np.log(emissions)
+
+        return log_transitions[-1], log_transitions[:-1], log_emissions
+
+    def decode(self, words):
+        """
+        Finds the most likely states of a sequence of words.
+
+        :param words: the words to decode
+
+        :return: the most likely state of each word
+        """
+
+        if len(words) == 0:
+            return []
+
+        path = viterbi_dense(self.encode_words(words), *self.log_probabilities())
+        return [self.states[index] for index in path]
+
+    def probability_tables(self):
+        """
+        Gets the smoothed probabilities of the model as the dictionaries used
+        by viterbi, with the unknown word as None.
+
+        :return: the transition probabilities
+        :return: the emission probabilities
+        """
+
+        transitions = _normalize(self.transition_counts, self.smoothing)
+        emissions = _normalize(self.emission_counts, self.smoothing)
+
+        previous_states = self.states + [None]
+        words = self.vocabulary + [None]
+
+        transition_probabilities = {previous_state: dict(zip(self.states, row.tolist()))
+                                    for previous_state, row in zip(previous_states, transitions)}
+        emission_probabilities = {state: dict(zip(words, row.tolist())) for state, row in zip(self.states, emissions)}
+
+        return transition_probabilities, emission_probabilities
+
+
+def _normalize(counts, smoothing):
+    """
+    Turns each row of counts into probabilities, adding the smoothing to every
+    count.
+
+    Rows without any counts or smoothing are left as zeros.
+    """
+
+    counts = counts + smoothing
+    totals = np.sum(counts, axis = 1, keepdims = True)
+
+    return np.divide(counts, totals, out = np.zeros(counts.shape), where = totals > 0)
+
+def build_vocabulary(tagged_sentences, *, min_count = 1):
+    """
+    Finds the words that appear at least the given number of times.
+
+    :param tagged_sentences: sentences of (word, state) pairs
+    :param min_count: the number of times a word must appear to be known (default 1)
+
+    :return: the sorted vocabulary
+    """
+
+    counts = collections.Counter(word for sentence in tagged_sentences for word, _ in sentence)
+    return sorted(word for word, count in counts.items() if count >= min_count)
+
+def train_hmm(tagged_sentences, *, states = None, vocabulary = None, min_count = 1, smoothing = 1.0, n_jobs = 1):
+    """
+    Trains a hidden Markov model on tagged sentences.
+
+    With more than one job, the sentences are split into one shard per
+    process, each shard is counted separately, and the counts are merged.
+
+    :param tagged_sentences: sentences of (word, state) pairs
+    :param states: the hidden states (default the states in the sentences)
+    :param vocabulary: the known words (default the words that appear at least min_count times)
+    :param min_count: the number of times a word must appear to be known, if no vocabulary is given (default 1)
+    :param smoothing: the pseudo count added to every transition and emission (default 1.0)
+    :param n_jobs: the number of processes to count with (default 1)
+
+    :return: the trained HMM
+    """
+
+    tagged_sentences = list(tagged_sentences)
+
+    if states is None:
+        states = sorted(set(state for sentence in tagged_sentences for _, state in sentence))
+
+    if vocabulary is None:
+        vocabulary = build_vocabulary(tagged_sentences, min_count = min_count)
+
+    model = HMM(states, vocabulary, smoothing = smoothing)
+
+    if n_jobs <= 1:
+        model.add(tagged_sentences)
+        return model
+
+    shard_size = -(-len(tagged_sentences) // n_jobs)
+    shards = [tagged_sentences[start:start + shard_size] for start in range(0, len(tagged_sentences), shard_size)]
+
+    with multiprocessing.Pool(n_jobs) as pool:
+        shard_models = pool.starmap(_count_shard, [(states, vocabulary, shard) for shard in shards])
+
+    for shard_model in shard_models:
+        model.merge(shard_model)
+
+    return model
+
+def _count_shard(states, vocabulary, tagged_sentences):
+    """
+    Counts a shard of tagged sentences in a worker process.
+
+    :return: an HMM with the counts of the shard
+    """
+
+    model = HMM(states, vocabulary)
+    model.add(tagged_sentences)
+
+    return model
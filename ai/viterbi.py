@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def viterbi(observations, states, transition_probabilities, emission_probabilities):
     scores = []
     back_pointers = []
@@ -47,3 +50,42 @@ def viterbi(observations, states, transition_probabilities, emission_probabiliti
         max_state = back_pointers[len(observations) - 1 - offset][max_state]
 
     return states[::-1]
+
+def viterbi_dense(observations, log_start, log_transitions, log_emissions):
+    """
+    Finds the most likely sequence of states with the viterbi algorithm, using
+    dense matrices of log probabilities.
+
+    Every state is scored for each observation at once, so only the walk over
+    the observations is a Python loop.
+
+    :param observations: the word index of each observation
+    :param log_start: the log probability of starting in each state
+    :param log_transitions: a (states x states) matrix of the log probability of moving from each state to each state
+    :param log_emissions: a (states x words) matrix of the log probability of each state emitting each word
+
+    :return: an array of the index of the most likely state of each observation
+    """
+
+    observations = np.asarray(observations)
+    state_indices = np.arange(len(log_start))
+
+    scores = log_start + log_emissions[:, observations[0]]
+    back_pointers = np.zeros((len(observations), len(log_start)), dtype = np.int64)
+
+    # walk forward, where candidates[previous, state] scores moving from the
+    # previous state to the state
+    for index in range(1, len(observations)):
+        candidates = scores[:, np.newaxis] + log_transitions
+
+        back_pointers[index] = np.argmax(candidates, axis = 0)
+        scores = candidates[back_pointers[index], state_indices] + log_emissions[:, observations[index]]
+
+    # rebuild sequence
+    states = np.empty(len(observations), dtype = np.int64)
+    states[-1] = np.argmax(scores)
+
+    for index in range(len(observations) - 1, 0, -1):
+        states[index - 1] = back_pointers[index, states[index]]
+
+    return states
@@ -0,0 +1,61 @@
+import argparse
+import sys
+
+from learnz.benchmarks.runner import compare_results, load_results, run_benchmarks, save_results
+from learnz.benchmarks.suite import BENCHMARKS, SCALES
+
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(prog = "python -m learnz.benchmarks",
+                                     description = "Measures the performance of learnz on synthetic data.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    run_parser = subparsers.add_parser("run", help = "run benchmarks and save the results as JSON")
+    run_parser.add_argument("output", help = "the file to save the results to")
+    run_parser.add_argument("--scale", choices = list(SCALES), default = "small")
+    run_parser.add_argument("--repeats", type = int, default = 3)
+    run_parser.add_argument("--only", nargs = "+", choices = list(BENCHMARKS), help = "the benchmarks to run")
+
+    compare_parser = subparsers.add_parser("compare", help = "compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type = float, default = 0.1,
+                                help = "the fractional growth that counts as a regression (default 0.1)")
+
+    subparsers.add_parser("list", help = "list the benchmarks")
+
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == "list":
+        for name in BENCHMARKS:
+            print(name)
+
+        return 0
+
+    if arguments.command == "run":
+        results = run_benchmarks(arguments.scale, names = arguments.only, repeats = arguments.repeats)
+        save_results(arguments.output, results)
+
+        for name, result in results["results"].items():
+            print(f"{name:36}{result['seconds']:10.4f} s{result['peak_memory'] / 2 ** 20:10.1f} MiB"
+                  f"{result['throughput']:14.0f} items/s")
+
+        return 0
+
+    baseline = load_results(arguments.baseline)
+    current = load_results(arguments.current)
+
+    if baseline["environment"]["scale"] != current["environment"]["scale"]:
+        print("Warning: the results were measured at different scales")
+
+    comparisons = compare_results(baseline, current, threshold = arguments.threshold)
+
+    for name, measurement, baseline_value, current_value, ratio, regressed in comparisons:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:36}{measurement:14}{baseline_value:14.4g}{current_value:14.4g}{ratio:8.2f}x  {flag}")
+
+    # a non-zero exit code lets scripts fail on regressions
+    return 1 if any(regressed for *_, regressed in comparisons) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+
+def sparse_classification(rows, features, density, *, seed = 0):
+    """
+    Generates a linearly separable sparse binary classification problem.
+
+    :param rows: the number of examples
+    :param features: the number of features
+    :param density: the fraction of features present in each example
+    :param seed: the seed of the random generator (default 0)
+
+    :return: a CSR feature matrix
+    :return: a label vector of -1 and 1
+    """
+
+    rng = np.random.default_rng(seed)
+
+    x = scipy.sparse.random(rows, features, density = density, format = "csr", random_state = rng)
+    x.indices = x.indices.astype(np.int32)
+    x.indptr = x.indptr.astype(np.int32)
+
+    weights = rng.normal(size = features)
+    y = np.where(x.dot(weights) >= 0, 1.0, -1.0)
+
+    return x, y
+
+def write_libsvm(path, x, y):
+    """
+    Writes features and labels to a libsvm file.
+
+    :param path: the path of the file to write
+    :param x: a CSR feature matrix
+    :param y: a label vector
+    """
+
+    with open(path, "w") as data_file:
+        for row_index in range(x.shape[0]):
+            start, end = x.indptr[row_index], x.indptr[row_index + 1]
+            features = " ".join(f"{index}:{value:.6g}" for index, value in zip(x.indices[start:end], x.data[start:end]))
+
+            data_file.write(f"{y[row_index]:g} {features}\n")
+
+def blobs(rows, features, center_count, *, seed = 0):
+    """
+    Generates dense points scattered around randomly placed centers.
+
+    :param rows: the number of points
+    :param features: the number of dimensions of each point
+    :param center_count: the number of centers
+    :param seed: the seed of the random generator (default 0)
+
+    :return: a (rows x features) array of points
+    """
+
+    rng = np.random.default_rng(seed)
+
+    centers = rng.uniform(-100, 100, size = (center_count, features))
+    assignments = rng.integers(center_count, size = rows)
+
+    return centers[assignments] + rng.normal(size = (rows, features))
+
+def categorical_frame(rows, features, values, *, label_name = "label", seed = 0):
+    """
+    Generates a data frame of categorical features with a label that depends on
+    a few of them.
+
+    :param rows: the number of rows
+    :param features: the number of feature columns
+    :param values: the number of values of each feature
+    :param label_name: the name of the label column (default "label")
+    :param seed: the seed of the random generator (default 0)
+
+    :return: a data frame
+    """
+
+    rng = np.random.default_rng(seed)
+
+    codes = rng.integers(values, size = (rows, features))
+    data = pd.DataFrame(codes, columns = [f"feature_{index}" for index in range(features)])
+
+    noise = rng.random(rows) < 0.05
+    data[label_name] = np.where(noise, rng.integers(3, size = rows), (codes[:, 0] + codes[:, 1 % features] * codes[:, 2 % features]) % 3)
+
+    return data
+
+def token_sentences(sentence_count, vocab_size, *, length = 20, seed = 0):
+    """
+    Generates sentences of tokens with Zipf distributed frequencies, like the
+    words of natural text.
+
+    :param sentence_count: the number of sentences
+    :param vocab_size: the number of distinct tokens
+    :param length: the number of tokens in each sentence (default 20)
+    :param seed: the seed of the random generator (default 0)
+
+    :return: a list of sentences, each a list of token strings
+    """
+
+    rng = np.random.default_rng(seed)
+
+    probabilities = 1.0 / np.arange(1, vocab_size + 1)
+    probabilities /= probabilities.sum()
+
+    tokens = rng.choice(vocab_size, size = (sentence_count, length), p = probabilities)
+
+    return [[f"w{token}" for token in sentence] for sentence in tokens]
+
+def hidden_markov_model(state_count, vocab_size, *, seed = 0):
+    """
+    Generates random transition and emission probabilities in the format used
+    by viterbi.
+
+    :param state_count: the number of hidden states
+    :param vocab_size: the number of observable words
+    :param seed: the seed of the random generator (default 0)
+
+    :return: the states
+    :return: the transition probabilities
+    :return: the emission probabilities
+    :return: the observable words
+    """
+
+    rng = np.random.default_rng(seed)
+
+    states = [f"s{index}" for index in range(state_count)]
+    words = [f"w{index}" for index in range(vocab_size)]
+
+    transition_probabilities = {previous_state: dict(zip(states, rng.dirichlet(np.ones(state_count))))
+                                for previous_state in [None] + states}
+    emission_probabilities = {state: dict(zip(words, rng.dirichlet(np.ones(vocab_size))))
+                              for state in states}
+
+    return states, transition_probabilities, emission_probabilities, words
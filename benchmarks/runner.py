@@ -0,0 +1,118 @@
+import datetime
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from learnz.benchmarks.suite import BENCHMARKS, SCALES
+
+
+def run_benchmarks(scale_name, *, names = None, repeats = 3):
+    """
+    Runs benchmarks at the given scale.
+
+    Each benchmark is timed repeats times and the fastest time is kept, since
+    slower runs are slowed by other work on the machine. Peak memory is
+    measured in one more run with tracemalloc, which numpy reports its
+    allocations to, so that tracing does not slow the timed runs.
+
+    :param scale_name: the name of a scale in SCALES
+    :param names: the names of the benchmarks to run (default all of them)
+    :param repeats: the number of timed runs of each benchmark (default 3)
+
+    :return: a dictionary of the results and the environment they were measured in
+    """
+
+    if scale_name not in SCALES:
+        raise Exception(f"Unrecognized scale: {scale_name}")
+
+    scale = SCALES[scale_name]
+    names = list(BENCHMARKS) if names is None else names
+
+    results = dict()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            if name not in BENCHMARKS:
+                raise Exception(f"Unrecognized benchmark: {name}")
+
+            run, item_count = BENCHMARKS[name](scale, workdir)
+
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            run()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = dict(seconds = min(times),
+                                 times = times,
+                                 peak_memory = peak_memory,
+                                 items = item_count,
+                                 throughput = item_count / min(times))
+
+    return dict(environment = _environment(scale_name), results = results)
+
+def _environment(scale_name):
+    """
+    :return: a description of the machine and versions the benchmarks are run with
+    """
+
+    import pandas
+    import scipy
+
+    return dict(scale = scale_name,
+                time = datetime.datetime.now().isoformat(timespec = "seconds"),
+                python = platform.python_version(),
+                platform = platform.platform(),
+                processor = platform.processor(),
+                numpy = np.__version__,
+                scipy = scipy.__version__,
+                pandas = pandas.__version__)
+
+def save_results(path, results):
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent = 2)
+
+def load_results(path):
+    with open(path, "r") as results_file:
+        return json.load(results_file)
+
+def compare_results(baseline, current, *, threshold = 0.1):
+    """
+    Compares two sets of benchmark results.
+
+    A benchmark has regressed if its time or peak memory grew by more than the
+    threshold, as a fraction of the baseline.
+
+    :param baseline: the results to compare against
+    :param current: the new results
+    :param threshold: the fraction a measurement can grow by before it is a regression (default 0.1)
+
+    :return: a list of comparisons, with the benchmark name, measurement, baseline value, current value, ratio and
+             whether or not it regressed
+    """
+
+    comparisons = []
+
+    for name, current_result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+
+        baseline_result = baseline["results"][name]
+
+        for measurement in ("seconds", "peak_memory"):
+            baseline_value = baseline_result[measurement]
+            current_value = current_result[measurement]
+
+            ratio = current_value / baseline_value if baseline_value > 0 else 1.0
+            comparisons.append((name, measurement, baseline_value, current_value, ratio, ratio > 1 + threshold))
+
+    return comparisons
@@ -0,0 +1,208 @@
+import os
+import random
+import subprocess
+import sys
+
+from learnz.benchmarks import generators
+
+
+# the sizes of the generated data at each scale
+SCALES = {
+    "small": dict(rows = 2000, features = 1000, density = 0.01,
+                  cluster_rows = 500, dimensions = 2, center_count = 4,
+                  tree_rows = 5000, tree_features = 10, tree_values = 5,
+                  sentences = 1000, vocab_size = 1000,
+                  state_count = 5, observations = 100,
+                  fold_count = 3),
+    "medium": dict(rows = 20000, features = 10000, density = 0.005,
+                   cluster_rows = 5000, dimensions = 8, center_count = 8,
+                   tree_rows = 50000, tree_features = 20, tree_values = 10,
+                   sentences = 10000, vocab_size = 10000,
+                   state_count = 20, observations = 1000,
+                   fold_count = 5),
+    "large": dict(rows = 200000, features = 100000, density = 0.001,
+                  cluster_rows = 20000, dimensions = 16, center_count = 16,
+                  tree_rows = 500000, tree_features = 40, tree_values = 20,
+                  sentences = 100000, vocab_size = 50000,
+                  state_count = 50, observations = 5000,
+                  fold_count = 5)
+}
+
+# each benchmark sets up its data for a scale and returns a function to time,
+# along with the number of items the function processes
+BENCHMARKS = dict()
+
+def benchmark(name):
+    """
+    Registers a benchmark setup function under the given name.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+# each import is run in a new interpreter, and fails if it imports a module
+# that the code path it is for does not use
+STARTUP_IMPORTS = [
+    ("from learnz.ml.models import Perceptron", ("pandas", "scipy", "numba")),
+    ("import learnz.nlp.ngram", ("pandas", "scipy", "numba")),
+    ("import learnz.ml.cross_validation.cross_validation", ("pandas", "scipy", "numba")),
+    ("import learnz.ml.data", ("pandas", "scipy", "numba")),
+    ("from learnz.ml.models import DecisionTree", ("scipy", "numba"))
+]
+
+@benchmark("startup")
+def startup(scale, workdir):
+    environment = dict(os.environ, PYTHONPATH = os.pathsep.join(path for path in sys.path if path))
+
+    def run():
+        for statement, unused_modules in STARTUP_IMPORTS:
+            check = f"import sys; {statement}; print(' '.join(name for name in {unused_modules!r} if name in sys.modules))"
+            result = subprocess.run([sys.executable, "-c", check], env = environment, capture_output = True, text = True,
+                                    check = True)
+
+            if result.stdout.strip() != "":
+                raise Exception(f"{statement} imported {result.stdout.strip()}")
+
+    return run, len(STARTUP_IMPORTS)
+
+@benchmark("data.read_libsvm")
+def read_libsvm(scale, workdir):
+    from learnz.ml.data import read_libsvm
+
+    x, y = generators.sparse_classification(scale["rows"], scale["features"], scale["density"])
+
+    path = os.path.join(workdir, "data.libsvm")
+    generators.write_libsvm(path, x, y)
+
+    return lambda: read_libsvm(path, num_features = scale["features"]), scale["rows"]
+
+@benchmark("perceptron.train")
+def perceptron_train(scale, workdir):
+    from learnz.ml.models import Perceptron
+
+    data = generators.sparse_classification(scale["rows"], scale["features"], scale["density"])
+    epochs = 10
+
+    def run():
+        random.seed(0)
+        Perceptron().train(data, epochs = epochs)
+
+    return run, scale["rows"] * epochs
+
+@benchmark("perceptron.train.float32")
+def perceptron_train_float32(scale, workdir):
+    import numpy as np
+    from learnz.ml.models import Perceptron
+
+    x, y = generators.sparse_classification(scale["rows"], scale["features"], scale["density"])
+    data = (x.astype(np.float32), y.astype(np.float32))
+    epochs = 10
+
+    def run():
+        random.seed(0)
+        Perceptron().train(data, epochs = epochs, dtype = np.float32)
+
+    return run, scale["rows"] * epochs
+
+@benchmark("clustering.lloyds_algorithm")
+def lloyds_algorithm(scale, workdir):
+    from learnz.ml.clustering import euclidean_distance, lloyds_algorithm
+
+    data = generators.blobs(scale["cluster_rows"], scale["dimensions"], scale["center_count"])
+    centers = list(data[:scale["center_count"]])
+
+    return lambda: lloyds_algorithm(centers, data, euclidean_distance), scale["cluster_rows"]
+
+@benchmark("decision_tree.train")
+def decision_tree_train(scale, workdir):
+    from learnz.ml.models import DecisionTree
+
+    data = generators.categorical_frame(scale["tree_rows"], scale["tree_features"], scale["tree_values"])
+
+    return lambda: DecisionTree("label").train(data), scale["tree_rows"]
+
+@benchmark("ngram.add")
+def ngram_add(scale, workdir):
+    from learnz.nlp.ngram import Ngram
+
+    sentences = generators.token_sentences(scale["sentences"], scale["vocab_size"])
+
+    def run():
+        ngram = Ngram(3)
+        for sentence in sentences:
+            ngram.add(sentence)
+
+    return run, sum(len(sentence) for sentence in sentences)
+
+@benchmark("ngram.log_probability")
+def ngram_log_probability(scale, workdir):
+    from learnz.nlp.ngram import Ngram
+
+    sentences = generators.token_sentences(scale["sentences"], scale["vocab_size"])
+
+    ngram = Ngram(3, smoothing = 1)
+    for sentence in sentences:
+        ngram.add(sentence)
+
+    def run():
+        for sentence in sentences:
+            ngram.log_probability(sentence)
+
+    return run, sum(len(sentence) for sentence in sentences)
+
+@benchmark("viterbi")
+def viterbi(scale, workdir):
+    import numpy as np
+    from learnz.ai.viterbi import viterbi
+
+    states, transition_probabilities, emission_probabilities, words = generators.hidden_markov_model(scale["state_count"],
+                                                                                                     scale["vocab_size"])
+
+    rng = np.random.default_rng(0)
+    observations = [words[index] for index in rng.integers(len(words), size = scale["observations"])]
+
+    return lambda: viterbi(observations, states, transition_probabilities, emission_probabilities), scale["observations"]
+
+@benchmark("hmm.train")
+def hmm_train(scale, workdir):
+    from learnz.ai.hmm import train_hmm
+
+    sentences = generators.token_sentences(scale["sentences"], scale["vocab_size"])
+    tagged_sentences = [[(word, f"s{int(word[1:]) % scale['state_count']}") for word in sentence] for sentence in sentences]
+
+    return lambda: train_hmm(tagged_sentences, min_count = 2), sum(len(sentence) for sentence in sentences)
+
+@benchmark("hmm.decode")
+def hmm_decode(scale, workdir):
+    import numpy as np
+    from learnz.ai.hmm import HMM
+
+    states, transition_probabilities, emission_probabilities, words = generators.hidden_markov_model(scale["state_count"],
+                                                                                                     scale["vocab_size"])
+
+    rng = np.random.default_rng(0)
+    observations = [words[index] for index in rng.integers(len(words), size = scale["observations"])]
+
+    # random counts stand in for a trained model
+    model = HMM(states, words)
+    model.transition_counts[:] = rng.integers(100, size = model.transition_counts.shape)
+    model.emission_counts[:] = rng.integers(100, size = model.emission_counts.shape)
+
+    return lambda: model.decode(observations), scale["observations"]
+
+@benchmark("cross_validation.cross_validate")
+def cross_validate(scale, workdir):
+    from learnz.ml.cross_validation.cross_validation import cross_validate
+    from learnz.ml.models import Perceptron
+
+    data = generators.sparse_classification(scale["rows"], scale["features"], scale["density"])
+    hyperparameter_ranges = dict(learning_rate = [0.1, 1.0], epochs = [5, 10])
+
+    def run():
+        random.seed(0)
+        cross_validate(Perceptron(), data, scale["fold_count"], **hyperparameter_ranges)
+
+    return run, scale["rows"] * 4
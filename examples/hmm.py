@@ -0,0 +1,26 @@
+# An example of training a hidden Markov model from a tagged corpus, and using
+# it to determine the most likely POS tags for a sequence of words.
+
+from learnz.ai.hmm import train_hmm
+
+# Each sentence is a list of (word, tag) pairs
+tagged_sentences = [
+    [("seals", "noun"), ("report", "verb"), ("news", "noun")],
+    [("california", "noun"), ("seals", "verb"), ("deals", "noun")],
+    [("reporters", "noun"), ("report", "verb")],
+    [("california", "noun"), ("report", "noun"), ("seals", "verb"), ("approval", "noun")]
+]
+
+# Words seen fewer than min_count times are treated as unknown words
+model = train_hmm(tagged_sentences, min_count = 1, smoothing = 0.1)
+
+observations = ["california", "seals", "report"]
+most_likely_sequence = model.decode(observations)
+
+padding_length = max(map(lambda word: len(word), observations)) + 2
+for word, tag in zip(observations, most_likely_sequence):
+    print(f"{word:{padding_length}}{tag}")
+
+# The model can also be given to the dictionary based viterbi
+transition_probabilities, emission_probabilities = model.probability_tables()
+print(transition_probabilities[None])
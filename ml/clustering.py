@@ -1,6 +1,8 @@
 import numpy as np
 import random
 
+from learnz.ml import instrumentation
+
 
 def euclidean_distance(vector_one, vector_two):
     """
@@ -95,7 +97,8 @@ def get_clusters(centers, data, distance_function):
 
     return clusters
 
-def gonzalez(data, center_count, distance_function = euclidean_distance, *, run_lloyds = True, return_centers = False):
+def gonzalez(data, center_count, distance_function = euclidean_distance, *, run_lloyds = True, return_centers = False,
+             dtype = None):
     """
     The Gonzalez algorithm for k-means clustering.
 
@@ -113,10 +116,14 @@ def gonzalez(data, center_count, distance_function = euclidean_distance, *, run_
     :param distance_function: the distance function to use (default is euclidean)
     :param run_lloyds: if True, run Lloyd's algorithm on the initial centers (default True)
     :param return_centers: if True, the centers of the clusters will be returned with the clusters
+    :param dtype: the type to convert the data and centers to, such as float32 (default keeps the data's type)
 
     :return: the clusters created by the gonzalez algorithm
     """
 
+    if dtype is not None:
+        data = np.asarray(data, dtype = dtype)
+
     centers = [data[0]]
 
     while len(centers) < center_count:
@@ -133,7 +140,7 @@ def gonzalez(data, center_count, distance_function = euclidean_distance, *, run_
         centers.append(max_vector)
 
     if run_lloyds:
-        centers = lloyds_algorithm(centers, data, distance_function)
+        centers = lloyds_algorithm(centers, data, distance_function, dtype = dtype)
 
     clusters = get_clusters(centers, data, distance_function)
 
@@ -142,7 +149,8 @@ def gonzalez(data, center_count, distance_function = euclidean_distance, *, run_
 
     return clusters
 
-def kmeans_pp(data, center_count, distance_function = euclidean_distance, *, run_lloyds = True, return_centers = False):
+def kmeans_pp(data, center_count, distance_function = euclidean_distance, *, run_lloyds = True, return_centers = False,
+              dtype = None):
     """
     The k-means++ algorithm for k-means clustering.
 
@@ -161,10 +169,14 @@ def kmeans_pp(data, center_count, distance_function = euclidean_distance, *, run
     :param distance_function: the distance function to use (default is euclidean)
     :param run_lloyds: if True, run Lloyd's algorithm on the initial centers (default True)
     :param return_centers: if True, the centers of the clusters will be returned with the clusters (default False)
+    :param dtype: the type to convert the data and centers to, such as float32 (default keeps the data's type)
 
     :return: the clusters created by the k-means++ algorithm
     """
 
+    if dtype is not None:
+        data = np.asarray(data, dtype = dtype)
+
     centers = [data[0]]
 
     while len(centers) < center_count:
@@ -184,7 +196,7 @@ def kmeans_pp(data, center_count, distance_function = euclidean_distance, *, run
                 break
 
     if run_lloyds:
-        centers = lloyds_algorithm(centers, data, distance_function)
+        centers = lloyds_algorithm(centers, data, distance_function, dtype = dtype)
 
     clusters = get_clusters(centers, data, distance_function)
 
@@ -193,33 +205,45 @@ def kmeans_pp(data, center_count, distance_function = euclidean_distance, *, run
 
     return clusters
 
-def lloyds_algorithm(centers, data, distance_function):
+def lloyds_algorithm(centers, data, distance_function, *, dtype = None):
     """
     Executes lloyd's algorithm and returns the new centers.
 
     data can be a list of numpy vectors or a numpy array of numpy vectors.
 
+    If a dtype is given the data and centers are converted to it, and the new
+    centers are averaged in it.
+
     The given distance function will be used to calculate the distance between a
     pair of vectors.
 
     :param centers: the centers to adjust
     :param data: list of vectors to cluster
     :param distance_function: the distance function to use
+    :param dtype: the type to convert the data and centers to, such as float32 (default keeps the data's type)
 
     :return: the adjusted clusters
     """
 
-    while True:
-        clusters = get_clusters(centers, data, distance_function)
-        new_centers = [np.average(cluster, axis = 0) for cluster in clusters]
+    if dtype is not None:
+        data = np.asarray(data, dtype = dtype)
+        centers = [np.asarray(center, dtype = dtype) for center in centers]
 
-        changed = False
-        for old_center, new_center in zip(centers, new_centers):
-            if not np.array_equal(old_center, new_center):
-                changed = True
-                break
+    with instrumentation.timer("lloyds_algorithm"):
+        while True:
+            instrumentation.count("lloyds_algorithm.iterations")
+            instrumentation.count("lloyds_algorithm.distance_evaluations", len(data) * len(centers))
+
+            clusters = get_clusters(centers, data, distance_function)
+            new_centers = [np.average(cluster, axis = 0) for cluster in clusters]
+
+            changed = False
+            for old_center, new_center in zip(centers, new_centers):
+                if not np.array_equal(old_center, new_center):
+                    changed = True
+                    break
 
-        if not changed:
-            return centers
+            if not changed:
+                return centers
 
-        centers = new_centers
+            centers = new_centers
@@ -1,24 +1,121 @@
+import copy
 import itertools
+import math
+import multiprocessing
 import numpy as np
+import random
 
-from learnz.ml.cross_validation.folds import create_folds, join_folds
+from learnz.ml.cross_validation.folds import count_rows, create_fold_indices, split_fold_indices, take_rows, join_folds
+from learnz.ml import instrumentation
+from learnz.ml.shared_memory import SharedArrays, attach_shared_arrays, get_shared_data, share_data
 import learnz.ml.evaluation
 
 
-def cross_validate(model, data, fold_count, **hyperparameter_ranges):
-    folds = create_folds(data, fold_count)
+def cross_validate(model, data, fold_count, *, n_jobs = 1, shuffle = False, stratify = None, seed = None,
+                   warm_start = False, **hyperparameter_ranges):
+    """
+    Finds the hyperparameters with the best average accuracy over the folds of
+    the given data.
 
-    best_hyperparameters = None
-    best_evaluation = None
+    Folds are kept as row indices. The training and holdout data for each
+    holdout fold are gathered once and used for every hyperparameter
+    combination, rather than joining the other folds for each combination.
 
-    for hyperparameters in generate_hyperparameters(**hyperparameter_ranges):
-        evaluation = evaluate_folds(model, folds, **hyperparameters)
+    With more than one job, every combination of hyperparameters and holdout
+    fold is trained on a pool of processes. Each task trains its own copy of
+    the model, and numpy and CSR data is shared with the processes rather than
+    pickled for each task. The best hyperparameters are chosen in the same way
+    as when training serially.
 
-        if best_evaluation is None or evaluation > best_evaluation:
-            best_hyperparameters = hyperparameters
-            best_evaluation = evaluation
+    When warm starting a model that supports it, such as a Perceptron, the
+    combinations that only differ in the model's warm start hyperparameter are
+    trained one after another, each continuing from the last. Warm starting is
+    only done when training serially.
 
-    return best_hyperparameters
+    :param model: the model to train
+    :param data: the data to train and evaluate on
+    :param fold_count: the number of folds to split the data into
+    :param n_jobs: the number of processes to train with (default 1)
+    :param shuffle: whether or not to shuffle the rows before folding (default False)
+    :param stratify: the labels of the rows to stratify the folds by (default None)
+    :param seed: the seed used to shuffle (default None)
+    :param warm_start: whether or not to warm start models that support it (default False)
+    :param hyperparameter_ranges: the values to try for each hyperparameter
+
+    :return: the best hyperparameters
+    """
+
+    hyperparameter_list = list(generate_hyperparameters(**hyperparameter_ranges))
+    fold_indices = create_fold_indices(count_rows(data), fold_count, shuffle = shuffle, stratify = stratify, seed = seed)
+
+    evaluations = _evaluate_hyperparameters(model, FoldCache(data, fold_indices), hyperparameter_list, n_jobs,
+                                            warm_start = warm_start)
+    return _get_best_hyperparameters(hyperparameter_list, evaluations)
+
+def successive_halving(model, data, fold_count, hyperparameter_list, *, resource = "epochs", min_resource = 1,
+                       max_resource = None, reduction = 3, n_jobs = 1, shuffle = False, stratify = None, seed = None):
+    """
+    Finds the best of the given hyperparameters with successive halving.
+
+    Every candidate is first evaluated with a small resource. Only the best
+    1 / reduction of the candidates survive each round, and the resource is
+    multiplied by reduction for the next round, until one candidate remains or
+    the maximum resource is reached.
+
+    The resource is the value of the given hyperparameter, such as epochs. If
+    the resource is "rows" then it is the fraction resource / max_resource of
+    each training fold instead.
+
+    :param model: the model to train
+    :param data: the data to train and evaluate on
+    :param fold_count: the number of folds to split the data into
+    :param hyperparameter_list: the hyperparameter combinations to evaluate
+    :param resource: the hyperparameter to use as the resource, or "rows" (default "epochs")
+    :param min_resource: the resource of the first round (default 1)
+    :param max_resource: the largest resource (default enough rounds to leave one candidate)
+    :param reduction: the factor candidates are reduced by and the resource grows by each round (default 3)
+    :param n_jobs: the number of processes to train with (default 1)
+    :param shuffle: whether or not to shuffle the rows before folding (default False)
+    :param stratify: the labels of the rows to stratify the folds by (default None)
+    :param seed: the seed used to shuffle (default None)
+
+    :return: the best hyperparameters, including the resource if it is a hyperparameter
+    """
+
+    if reduction < 2:
+        raise Exception("The reduction must be at least two")
+
+    if max_resource is None:
+        round_count = math.ceil(math.log(max(len(hyperparameter_list), 1), reduction))
+        max_resource = min_resource * reduction ** round_count
+
+    fold_indices = create_fold_indices(count_rows(data), fold_count, shuffle = shuffle, stratify = stratify, seed = seed)
+    # every round uses the same folds, so they are kept between rounds
+    fold_cache = FoldCache(data, fold_indices, keep_splits = resource != "rows")
+
+    candidates = list(hyperparameter_list)
+    candidate_resource = min_resource
+
+    while True:
+        if resource == "rows":
+            round_candidates = candidates
+            train_fraction = candidate_resource / max_resource
+        else:
+            round_candidates = [dict(hyperparameters, **{resource: candidate_resource}) for hyperparameters in candidates]
+            train_fraction = 1.0
+
+        evaluations = _evaluate_hyperparameters(model, fold_cache, round_candidates, n_jobs,
+                                                train_fraction = train_fraction)
+
+        if len(candidates) == 1 or candidate_resource >= max_resource:
+            return _get_best_hyperparameters(round_candidates, evaluations)
+
+        # a stable sort keeps the earlier candidate of a tie, like cross_validate
+        survivor_count = max(1, math.ceil(len(candidates) / reduction))
+        survivors = sorted(np.argsort(-np.asarray(evaluations), kind = "stable")[:survivor_count])
+
+        candidates = [candidates[index] for index in survivors]
+        candidate_resource = min(candidate_resource * reduction, max_resource)
 
 def generate_hyperparameters(**hyperparameters):
     """
@@ -30,14 +127,298 @@ def generate_hyperparameters(**hyperparameters):
     for values in itertools.product(*possible_values):
         yield dict(zip(keys, values))
 
+def sample_hyperparameters(count, *, seed = None, **hyperparameters):
+    """
+    Generates random hyperparameter combinations.
+
+    Each hyperparameter is either a list of values to choose from uniformly,
+    or a function that takes a numpy random generator and returns a value.
+
+    :param count: the number of combinations to generate
+    :param seed: the seed of the random generator (default None)
+    :param hyperparameters: the possible values of each hyperparameter
+
+    :return: a generator of hyperparameter combinations
+    """
+
+    rng = np.random.default_rng(seed)
+
+    for _ in range(count):
+        values = dict()
+
+        for key, possible_values in hyperparameters.items():
+            if callable(possible_values):
+                values[key] = possible_values(rng)
+            else:
+                values[key] = possible_values[rng.integers(len(possible_values))]
+
+        yield values
+
+def _evaluate_hyperparameters(model, fold_cache, hyperparameter_list, n_jobs, *, train_fraction = 1.0, warm_start = False):
+    """
+    Evaluates every combination of hyperparameters on every holdout fold,
+    either serially or with a pool of processes.
+
+    :return: the average accuracy of each hyperparameter combination
+    """
+
+    if n_jobs > 1:
+        return _evaluate_parallel(model, fold_cache.data, fold_cache.fold_indices, hyperparameter_list, n_jobs,
+                                  train_fraction = train_fraction)
+
+    return evaluate_grid(model, fold_cache, hyperparameter_list, train_fraction = train_fraction, warm_start = warm_start)
+
+def _get_best_hyperparameters(hyperparameter_list, evaluations):
+    """
+    Finds the hyperparameters with the best evaluation, keeping the first of a
+    tie.
+
+    :param hyperparameter_list: the hyperparameter combinations
+    :param evaluations: the evaluation of each combination
+
+    :return: the best hyperparameters
+    """
+
+    best_hyperparameters = None
+    best_evaluation = None
+
+    for hyperparameters, evaluation in zip(hyperparameter_list, evaluations):
+        if best_evaluation is None or evaluation > best_evaluation:
+            best_hyperparameters = hyperparameters
+            best_evaluation = evaluation
+
+    return best_hyperparameters
+
 def evaluate_folds(model, folds, **hyperparameters):
     evaluations = []
     for holdout_index in range(len(folds)):
         data_train = join_folds(folds, holdout_index)
         data_test = folds[holdout_index]
 
+        evaluations.append(evaluate_split(model, data_train, data_test, **hyperparameters))
+
+    return np.average(evaluations)
+
+def evaluate_grid(model, fold_cache, hyperparameter_list, *, train_fraction = 1.0, warm_start = False):
+    """
+    Evaluates every combination of hyperparameters on every holdout fold.
+
+    The data for each holdout fold is gathered once by the fold cache and
+    reused for every combination. Unless the fold cache keeps every split, only
+    the data of one holdout fold is held at a time.
+
+    :param model: the model to train
+    :param fold_cache: the FoldCache of the data and folds to evaluate on
+    :param hyperparameter_list: the hyperparameter combinations to evaluate
+    :param train_fraction: the fraction of each training fold to train on (default 1.0)
+    :param warm_start: whether or not to warm start models that support it (default False)
+
+    :return: the average accuracy of each hyperparameter combination
+    """
+
+    fold_evaluations = np.zeros((len(hyperparameter_list), len(fold_cache.fold_indices)))
+
+    if warm_start and hasattr(model, "warm_start_parameter"):
+        order = _warm_start_order(model, hyperparameter_list)
+        extra_hyperparameters = dict(warm_start = True)
+    else:
+        order = range(len(hyperparameter_list))
+        extra_hyperparameters = dict()
+
+    for holdout_index in range(len(fold_cache.fold_indices)):
+        data_train, data_test = fold_cache.get(holdout_index, train_fraction)
+
+        for hyperparameter_index in order:
+            fold_evaluations[hyperparameter_index, holdout_index] = evaluate_split(model, data_train, data_test,
+                                                                                   **hyperparameter_list[hyperparameter_index],
+                                                                                   **extra_hyperparameters)
+
+        # let the split be freed before the next one is gathered
+        data_train = data_test = None
+
+    return [np.average(evaluations) for evaluations in fold_evaluations]
+
+def _warm_start_order(model, hyperparameter_list):
+    """
+    Orders hyperparameter combinations so that the combinations that only
+    differ in the model's warm start hyperparameter are next to each other, in
+    the order the model can warm start them in.
+
+    :return: the indices of the combinations in the order to train them
+    """
+
+    parameter = model.warm_start_parameter
+
+    groups = dict()
+    for index, hyperparameters in enumerate(hyperparameter_list):
+        others = repr(sorted((key, value) for key, value in hyperparameters.items() if key != parameter))
+        groups.setdefault(others, []).append(index)
+
+    def key(index):
+        hyperparameters = hyperparameter_list[index]
+        if parameter not in hyperparameters:
+            return -math.inf
+
+        return model.warm_start_order(hyperparameters[parameter])
+
+    return [index for group in groups.values() for index in sorted(group, key = key)]
+
+class FoldCache:
+    """
+    Gathers the training and holdout data of a holdout fold, and keeps it for
+    later uses of the same fold.
+
+    Only the most recent split is kept unless every split is asked for, since
+    together they hold every row of the data fold_count times over.
+    """
+
+    def __init__(self, data, fold_indices, *, keep_splits = False):
+        """
+        :param data: the data to train and evaluate on
+        :param fold_indices: the folds, as created by create_fold_indices
+        :param keep_splits: whether or not to keep every split rather than only the most recent (default False)
+        """
+
+        self.data = data
+        self.fold_indices = fold_indices
+        self.keep_splits = keep_splits
+
+        self._splits = dict()
+
+    def get(self, holdout_index, train_fraction = 1.0):
+        """
+        Gets the data of a holdout fold.
+
+        The same objects are returned every time, so models can recognize data
+        they have already trained on.
+
+        :param holdout_index: the index of the holdout fold
+        :param train_fraction: the fraction of the training fold to keep (default 1.0)
+
+        :return: the training data
+        :return: the holdout data
+        """
+
+        key = (holdout_index, train_fraction)
+
+        if key not in self._splits:
+            if not self.keep_splits:
+                self._splits.clear()
+
+            with instrumentation.timer("cross_validation.gather_folds"):
+                train_indices, test_indices = _split_fold_indices(self.fold_indices, holdout_index, train_fraction)
+                self._splits[key] = (take_rows(self.data, train_indices), take_rows(self.data, test_indices))
+
+        return self._splits[key]
+
+def _split_fold_indices(fold_indices, holdout_index, train_fraction):
+    """
+    Gets the training and holdout row indices for a holdout fold, keeping an
+    evenly spaced fraction of the training rows.
+
+    :return: the training row indices
+    :return: the holdout row indices
+    """
+
+    train_indices, test_indices = split_fold_indices(fold_indices, holdout_index)
+
+    if train_fraction < 1.0:
+        kept_count = max(1, int(len(train_indices) * train_fraction))
+        train_indices = train_indices[np.linspace(0, len(train_indices) - 1, kept_count).astype(np.int64)]
+
+    return train_indices, test_indices
+
+def evaluate_split(model, data_train, data_test, **hyperparameters):
+    """
+    Trains a model on the training data, and evaluates its accuracy on the
+    test data.
+
+    :param model: the model to train
+    :param data_train: the data to train on
+    :param data_test: the data to evaluate on
+    :param hyperparameters: the hyperparameters to train with
+
+    :return: the accuracy on the test data
+    """
+
+    with instrumentation.timer("cross_validation.train"):
         model.train(data_train, **hyperparameters)
+
+    with instrumentation.timer("cross_validation.evaluate"):
         [evaluation] = model.evaluate(data_test, learnz.ml.evaluation.accuracy)
-        evaluations.append(evaluation)
 
-    return np.average(evaluations)
+    return evaluation
+
+def _evaluate_parallel(model, data, fold_indices, hyperparameter_list, n_jobs, *, train_fraction = 1.0):
+    """
+    Evaluates every combination of hyperparameters on every holdout fold with a
+    pool of processes.
+
+    :param model: the model to train
+    :param data: the data to train and evaluate on
+    :param fold_indices: the folds, as created by create_fold_indices
+    :param hyperparameter_list: the hyperparameter combinations to evaluate
+    :param n_jobs: the number of processes to train with
+    :param train_fraction: the fraction of each training fold to train on
+
+    :return: the average accuracy of each hyperparameter combination
+    """
+
+    # tasks are grouped by holdout fold so that workers can reuse the data they
+    # gathered for the previous task, and each task is seeded from this process
+    # so the results are reproducible no matter which process runs it
+    tasks = [(hyperparameters, holdout_index, train_fraction, random.getrandbits(64))
+             for holdout_index in range(len(fold_indices))
+             for hyperparameters in hyperparameter_list]
+
+    with SharedArrays() as shared:
+        description = share_data(shared, data)
+        initargs = (shared.specs, description, model, fold_indices)
+
+        with multiprocessing.Pool(n_jobs, initializer = _initialize_worker, initargs = initargs) as pool:
+            fold_evaluations = pool.starmap(_evaluate_task, tasks)
+
+    # results come back in task order, so they are grouped the same way no
+    # matter which process finished first
+    fold_evaluations = np.reshape(fold_evaluations, (len(fold_indices), len(hyperparameter_list)))
+    return [np.average(evaluations) for evaluations in fold_evaluations.T]
+
+_worker_model = None
+_worker_data = None
+_worker_fold_indices = None
+_worker_split = (None, None, None)
+
+def _initialize_worker(specs, description, model, fold_indices):
+    """
+    Attaches the shared data in a worker process.
+    """
+
+    global _worker_model, _worker_data, _worker_fold_indices
+
+    attach_shared_arrays(specs)
+
+    _worker_model = model
+    _worker_data = get_shared_data(description)
+    _worker_fold_indices = fold_indices
+
+def _evaluate_task(hyperparameters, holdout_index, train_fraction, seed):
+    """
+    Evaluates one combination of hyperparameters on one holdout fold with a
+    fresh copy of the model in a worker process.
+
+    The data gathered for the most recent holdout fold is kept for the next
+    task.
+    """
+
+    global _worker_split
+
+    if _worker_split[0] != (holdout_index, train_fraction):
+        train_indices, test_indices = _split_fold_indices(_worker_fold_indices, holdout_index, train_fraction)
+        _worker_split = ((holdout_index, train_fraction), take_rows(_worker_data, train_indices), take_rows(_worker_data, test_indices))
+
+    random.seed(seed)
+
+    _, data_train, data_test = _worker_split
+
+    model = copy.deepcopy(_worker_model)
+    return evaluate_split(model, data_train, data_test, **hyperparameters)
@@ -1,9 +1,9 @@
 import copy
 import itertools
 import numpy as np
-import pandas as pd
 import random
-import scipy.sparse.csr
+
+from learnz.ml.lazy import is_csr_matrix, is_dataframe
 
 
 def create_folds(data, count):
@@ -25,10 +25,10 @@ def create_folds(data, count):
     if isinstance(data, list):
         return _create_folds_list(data, count)
 
-    if isinstance(data, pd.DataFrame):
+    if is_dataframe(data):
         return _create_folds_pandas(data, count)
 
-    if isinstance(data, np.ndarray) or isinstance(data, scipy.sparse.csr.csr_matrix):
+    if isinstance(data, np.ndarray) or is_csr_matrix(data):
         return _create_folds_numpy(data, count)
 
     raise Exception(f"Unrecognized data type: {type(data)}")
@@ -115,6 +115,110 @@ def _create_folds_numpy(data, count):
 
     return folds
 
+def create_fold_indices(row_count, count, *, shuffle = False, stratify = None, seed = None):
+    """
+    Creates folds as arrays of row indices, without copying any data.
+
+    Without shuffling or stratification the folds are the same contiguous
+    ranges of rows as create_folds. When stratifying, the rows of each label
+    are dealt to the folds in turn so every fold has about the same label
+    proportions.
+
+    :param row_count: the number of rows in the data
+    :param count: the number of folds to create
+    :param shuffle: whether or not to shuffle the rows (default False)
+    :param stratify: the labels of the rows to stratify by (default None)
+    :param seed: the seed used to shuffle (default None)
+
+    :return: a list of sorted index arrays, one for each fold
+    """
+
+    if count < 1:
+        raise Exception("You cannot have less than one fold")
+
+    rows = np.arange(row_count)
+    if shuffle:
+        np.random.default_rng(seed).shuffle(rows)
+
+    if stratify is not None:
+        # a stable sort keeps the shuffled order within each label
+        rows = rows[np.argsort(np.asarray(stratify)[rows], kind = "stable")]
+        return [np.sort(rows[fold_index::count]) for fold_index in range(count)]
+
+    fold_count = row_count / count
+    folds = list()
+
+    for fold_index in range(count):
+        low = int(fold_index * fold_count)
+        high = int((fold_index + 1) * fold_count)
+
+        folds.append(np.sort(rows[low:high]))
+
+    return folds
+
+def split_fold_indices(fold_indices, holdout_index):
+    """
+    Gets the training and holdout row indices for a holdout fold.
+
+    :param fold_indices: the folds, as created by create_fold_indices
+    :param holdout_index: the index of the fold to holdout
+
+    :return: the sorted training row indices
+    :return: the holdout row indices
+    """
+
+    included_folds = _get_included_folds(fold_indices, holdout_index)
+    train_indices = np.sort(np.concatenate(included_folds)) if len(included_folds) > 0 else np.zeros(0, dtype = np.int64)
+
+    return train_indices, fold_indices[holdout_index]
+
+def count_rows(data):
+    """
+    Counts the rows of the given data.
+
+    :param data: the data to count
+
+    :return: the number of rows
+    """
+
+    if isinstance(data, tuple):
+        return count_rows(data[0])
+
+    if isinstance(data, list) or is_dataframe(data):
+        return len(data)
+
+    return data.shape[0]
+
+def take_rows(data, indices):
+    """
+    Takes the rows with the given indices from the data.
+
+    A contiguous range of rows is taken as a slice, which is a view rather than
+    a copy for numpy arrays.
+
+    :param data: the data to take rows from
+    :param indices: the sorted indices of the rows to take
+
+    :return: the selected rows, in the same form as the data
+    """
+
+    if not isinstance(indices, slice) and len(indices) > 0 and indices[-1] - indices[0] + 1 == len(indices):
+        indices = slice(int(indices[0]), int(indices[-1]) + 1)
+
+    if isinstance(data, tuple):
+        return tuple(take_rows(subdata, indices) for subdata in data)
+
+    if isinstance(data, list):
+        if isinstance(indices, slice):
+            return data[indices]
+
+        return [data[index] for index in indices]
+
+    if is_dataframe(data):
+        return data.iloc[indices]
+
+    return data[indices]
+
 def join_folds(folds, holdout_index = None):
     """
     Joins the given folds
@@ -133,16 +237,16 @@ def join_folds(folds, holdout_index = None):
     if isinstance(folds[0], list):
         return _join_folds_list(folds, holdout_index)
 
-    if isinstance(folds[0], pd.DataFrame):
+    if is_dataframe(folds[0]):
         return _join_folds_pandas(folds, holdout_index)
 
     if isinstance(folds[0], np.ndarray):
         return _join_folds_numpy(folds, holdout_index)
 
-    if isinstance(folds[0], scipy.sparse.csr.csr_matrix):
+    if is_csr_matrix(folds[0]):
         return _join_folds_csr_matrix(folds, holdout_index)
 
-    raise Exception(f"Unrecognized data type: {typep(data)}")
+    raise Exception(f"Unrecognized data type: {type(folds[0])}")
 
 def _join_folds_tuple(folds, holdout_index = None):
     """
@@ -193,6 +297,8 @@ def _join_folds_pandas(folds, holdout_index = None):
     :return: joined folds
     """
 
+    import pandas as pd
+
     included_folds = _get_included_folds(folds, holdout_index)
     return pd.concat(included_folds)
 
@@ -228,6 +334,8 @@ def _join_folds_csr_matrix(folds, holdout_index = None):
     :return: joined folds
     """
 
+    import scipy.sparse
+
     included_folds = _get_included_folds(folds, holdout_index)
     return scipy.sparse.vstack(included_folds)
 
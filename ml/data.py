@@ -1,7 +1,11 @@
+import importlib
+import itertools
 import numpy as np
-from scipy.sparse import csr_matrix
+import zlib
 
-def read_libsvm(data_path, *, num_features = None, append_bias = True):
+from learnz.ml import instrumentation
+
+def read_libsvm(data_path, *, num_features = None, append_bias = True, dtype = np.float64, hash_bits = None):
     """
     Reads a libsvm file to produce features and labels.
 
@@ -9,67 +13,300 @@ def read_libsvm(data_path, *, num_features = None, append_bias = True):
 
     A one is appended to the data by default to act as a bias term.
 
+    The feature matrix is built directly from CSR arrays. Column indices are
+    stored as 32 bit integers unless the number of values or features is too
+    large for them, and values and labels are stored using the given dtype.
+
+    When hashing, each feature is mapped to one of 2 ** hash_bits columns by a
+    hash of its index, so the number of features does not depend on the data.
+    Features can then be named by strings as well as integers. The hash also
+    decides whether a value is negated, so that the values of colliding
+    features tend to cancel out rather than add up. The bias is kept in a
+    column of its own after the hashed columns.
+
     :param data_path: the path to a libsvm file
     :param num_features: the number of features in the data
     :param append_bias: whether or not to append a 1 as a bias term
+    :param dtype: the type of the values in the feature matrix and the labels (default float64)
+    :param hash_bits: the number of bits of the hashed column indices, or None to not hash (default None)
 
     :return: a feature matrix
     :return: a label vector
     """
 
-    with open(data_path, "r") as data_file:
-        lines = data_file.readlines()
+    _import_scipy()
+
+    with instrumentation.timer("read_libsvm"):
+        with open(data_path, "r") as data_file:
+            lines = data_file.readlines()
+
+        data = _parse_libsvm_lines(lines, num_features = num_features, append_bias = append_bias, dtype = dtype,
+                                   hash_bits = hash_bits)
+
+    instrumentation.count("read_libsvm.rows", len(lines))
+    return data
+
+def read_libsvm_chunks(data_path, *, num_features = None, chunk_size = 10000, append_bias = True, dtype = np.float64,
+                       hash_bits = None):
+    """
+    Reads a libsvm file in chunks of rows, without holding the whole file in
+    memory.
+
+    The number of features cannot be inferred from part of the data, so it must
+    be specified to keep every chunk the same shape, unless features are hashed.
+
+    :param data_path: the path to a libsvm file
+    :param num_features: the number of features in the data, which can be None when hashing
+    :param chunk_size: the number of rows in each chunk (default 10000)
+    :param append_bias: whether or not to append a 1 as a bias term
+    :param dtype: the type of the values in the feature matrix and the labels (default float64)
+    :param hash_bits: the number of bits of the hashed column indices, or None to not hash (default None)
+
+    :return: a generator of feature matrix and label vector pairs
+    """
 
-        if num_features is None:
-            num_features = _count_libsvm_features(lines)
+    if chunk_size < 1:
+        raise Exception("Chunks must contain at least one row")
 
-        y = []
-        row_indices = []
-        column_indices = []
-        data = []
+    if num_features is None and hash_bits is None:
+        raise Exception("The number of features must be specified when features are not hashed")
 
-        for row_index, line in enumerate(lines):
-            elements = line.split()
-            y.append(float(elements[0]))
+    _import_scipy()
 
-            for element in elements[1:]:
-                column_index, value = element.split(":")
-                
-                row_indices.append(row_index)
-                column_indices.append(int(column_index))
-                data.append(float(value))
+    with open(data_path, "r") as data_file:
+        while True:
+            with instrumentation.timer("read_libsvm"):
+                lines = list(itertools.islice(data_file, chunk_size))
 
-            if append_bias:
-                row_indices.append(row_index)
-                column_indices.append(num_features)
-                data.append(1.0)
+                if len(lines) == 0:
+                    return
 
-        shape = (len(y), num_features + (1 if append_bias else 0))
-        x = csr_matrix((data, (row_indices, column_indices)), shape = shape)
+                chunk = _parse_libsvm_lines(lines, num_features = num_features, append_bias = append_bias, dtype = dtype,
+                                            hash_bits = hash_bits)
 
-        return x, np.array(y)
+            instrumentation.count("read_libsvm.rows", len(lines))
+            yield chunk
 
-def _count_libsvm_features(lines):
+def _import_scipy():
+    """
+    Imports scipy before reading is timed, so that the first read is not timed
+    as slower than the rest.
     """
-    Determine how many featues are present in a libsvm file.
+
+    importlib.import_module("scipy.sparse")
+
+def _parse_libsvm_lines(lines, *, num_features, append_bias, dtype, hash_bits = None):
+    """
+    Parses the lines of a libsvm file into features and labels.
 
     :param lines: the lines of a libsvm file
+    :param num_features: the number of features in the data, or None to infer it
+    :param append_bias: whether or not to append a 1 as a bias term
+    :param dtype: the type of the values in the feature matrix and the labels
+    :param hash_bits: the number of bits of the hashed column indices, or None to not hash
 
-    :return: the number of featues in the libsvm file
+    :return: a feature matrix
+    :return: a label vector
     """
 
+    from scipy.sparse import csr_matrix
+
+    if hash_bits is not None:
+        num_features = _hashed_feature_count(num_features, hash_bits)
+
+    indptr = _count_libsvm_values(lines, append_bias)
+    value_count = int(indptr[-1])
+
+    # column indices are read as 64 bit integers, since raw feature IDs can be
+    # larger than 32 bits, and are narrowed once the largest is known
+    y = np.empty(len(lines), dtype = dtype)
+    indices = np.empty(value_count, dtype = np.int64)
+
+    # the bias values are only set at the end, but are multiplied by the hash
+    # signs before then
+    data = np.zeros(value_count, dtype = dtype)
+
+    # the features are only hashed once all of their keys have been read
+    if hash_bits is not None:
+        keys = np.zeros(value_count, dtype = np.uint64)
+
+    min_column_index = 0
     max_column_index = -1
 
-    for line in lines:
+    for row_index, line in enumerate(lines):
         elements = line.split()
+        y[row_index] = float(elements[0])
+
+        features = [element.split(":") for element in elements[1:]]
+        if len(features) == 0:
+            continue
+
+        start = indptr[row_index]
+        end = start + len(features)
+
+        data[start:end] = [float(value) for _, value in features]
+
+        if hash_bits is not None:
+            keys[start:end] = [_feature_key(column_index) for column_index, _ in features]
+        else:
+            indices[start:end] = [int(column_index) for column_index, _ in features]
+            min_column_index = min(min_column_index, int(indices[start:end].min()))
+            max_column_index = max(max_column_index, int(indices[start:end].max()))
+
+    if hash_bits is not None:
+        indices[:], signs = _hash_keys(keys, hash_bits)
+        data *= signs
+
+    # the CSR arrays are built without checking them, so a column outside of
+    # the features would silently land in the wrong place
+    if min_column_index < 0:
+        raise Exception(f"LibSVM feature index {min_column_index} is negative")
+
+    if num_features is None:
+        if max_column_index == -1:
+            raise Exception("LibSVM file contains no data")
+
+        num_features = int(max_column_index) + 1
+
+    if max_column_index >= num_features:
+        raise Exception(f"LibSVM feature index {max_column_index} is outside of the {num_features} features")
+
+    # the bias is the last value of every row, its column is only known once
+    # the number of features has been determined
+    if append_bias:
+        indices[indptr[1:] - 1] = num_features
+        data[indptr[1:] - 1] = 1.0
+
+    shape = (len(y), num_features + (1 if append_bias else 0))
+
+    index_dtype = np.int32 if max(value_count, shape[1]) <= np.iinfo(np.int32).max else np.int64
+    indices = indices.astype(index_dtype, copy = False)
+    indptr = indptr.astype(index_dtype)
+
+    x = csr_matrix((data, indices, indptr), shape = shape, copy = False)
+
+    # features that collide in a row are added together
+    if hash_bits is not None:
+        x.sum_duplicates()
+
+    return x, y
 
-        for element in elements[1:]:
-            column_index = int(element.split(":")[0])
+def hash_features(x, hash_bits, *, append_bias = True):
+    """
+    Hashes the integer column indices of a CSR matrix in the same way as
+    read_libsvm, so that data from elsewhere can be used with models trained on
+    hashed libsvm data.
+
+    Like read_libsvm, a one is appended to every row by default as a bias term,
+    in a column of its own after the hashed columns.
+
+    :param x: a CSR matrix with non-negative column indices
+    :param hash_bits: the number of bits of the hashed column indices
+    :param append_bias: whether or not to append a 1 as a bias term (default True)
+
+    :return: a CSR matrix with 2 ** hash_bits columns, plus one for the bias
+    """
+
+    from scipy.sparse import csr_matrix, hstack
+
+    num_features = _hashed_feature_count(None, hash_bits)
+
+    indices, signs = _hash_keys(x.indices.astype(np.uint64), hash_bits)
+    index_dtype = np.int32 if num_features <= np.iinfo(np.int32).max else np.int64
+
+    hashed = csr_matrix((x.data * signs.astype(x.dtype), indices.astype(index_dtype), x.indptr.copy()),
+                        shape = (x.shape[0], num_features))
+    hashed.sum_duplicates()
+
+    if append_bias:
+        bias = csr_matrix(np.ones((x.shape[0], 1), dtype = hashed.dtype))
+        hashed = hstack([hashed, bias], format = "csr")
+
+    return hashed
+
+def _hashed_feature_count(num_features, hash_bits):
+    """
+    Checks the number of hash bits, and that it agrees with the number of
+    features if one was given.
+
+    :return: the number of hashed features
+    """
+
+    if not 1 <= hash_bits <= 62:
+        raise Exception("The number of hash bits must be between 1 and 62")
+
+    if num_features is not None and num_features != 2 ** hash_bits:
+        raise Exception(f"Hashing to {hash_bits} bits gives {2 ** hash_bits} features, not {num_features}")
+
+    return 2 ** hash_bits
+
+def _feature_key(column_index):
+    """
+    Gets the integer that a feature's index is hashed from.
+
+    Integer indices are their own keys. Other names are keyed by their CRC32
+    checksum with the top bit set, so that they cannot be confused with an
+    integer index. Neither depends on Python's hash, which changes between
+    processes.
+
+    :param column_index: the feature index or name read from a libsvm file
+
+    :return: the key of the feature
+    """
+
+    try:
+        return int(column_index) & _INTEGER_KEY_MASK
+    except ValueError:
+        return zlib.crc32(column_index.encode()) | _NAME_KEY_BIT
+
+_INTEGER_KEY_MASK = 2 ** 63 - 1
+_NAME_KEY_BIT = 2 ** 63
+
+def _hash_keys(keys, hash_bits):
+    """
+    Hashes feature keys to column indices and signs.
+
+    The keys are mixed with the 64 bit finalizer of MurmurHash3. The low bits
+    of the result are the column index, and the top bit is the sign.
+
+    :param keys: an array of unsigned 64 bit keys
+    :param hash_bits: the number of bits of the column indices
+
+    :return: the column indices
+    :return: the sign of each value, as 1 or -1
+    """
+
+    hashes = keys.copy()
+
+    # numpy wraps unsigned integers on overflow, as the hash expects
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(0xff51afd7ed558ccd)
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(0xc4ceb9fe1a85ec53)
+    hashes ^= hashes >> np.uint64(33)
+
+    indices = (hashes & np.uint64(2 ** hash_bits - 1)).astype(np.int64)
+    signs = np.where(hashes >> np.uint64(63), -1, 1).astype(np.int8)
+
+    return indices, signs
+
+def _count_libsvm_values(lines, append_bias):
+    """
+    Determines where each row of a libsvm file starts in the CSR arrays.
+
+    Every feature is written as index:value, so the number of values in a row
+    is the number of colons in its line.
+
+    :param lines: the lines of a libsvm file
+    :param append_bias: whether or not a bias term will be appended to each row
+
+    :return: the CSR row pointer array of the libsvm file
+    """
 
-            if column_index > max_column_index:
-                max_column_index = column_index
+    indptr = np.zeros(len(lines) + 1, dtype = np.int64)
+    indptr[1:] = [line.count(":") for line in lines]
 
-    if max_column_index == -1:
-        raise Exception("LibSVM file contains no data")
+    if append_bias:
+        indptr[1:] += 1
 
-    return max_column_index + 1
+    return np.cumsum(indptr, out = indptr)
@@ -1,7 +1,12 @@
 import math
+import multiprocessing
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
+from learnz.ml import instrumentation
 from learnz.ml.evaluation import evaluate
+from learnz.ml.shared_memory import SharedArrays, attach_shared_arrays, get_shared_arrays
 
 
 def entropy(data, feature_name):
@@ -38,6 +43,59 @@ def gini_index(data, feature_name):
 
     return gini_index
 
+def entropy_of_counts(counts):
+    """
+    Calculates the entropy of each row of label counts.
+
+    :param counts: an array whose last axis holds the count of each label
+
+    :return: the entropy of each row of counts
+    """
+
+    probabilities = _count_probabilities(counts)
+    logs = np.log2(probabilities, out = np.zeros_like(probabilities), where = probabilities > 0)
+
+    return -np.sum(probabilities * logs, axis = -1)
+
+def gini_index_of_counts(counts):
+    """
+    Calculates the gini index of each row of label counts.
+
+    :param counts: an array whose last axis holds the count of each label
+
+    :return: the gini index of each row of counts
+    """
+
+    probabilities = _count_probabilities(counts)
+    return 1 - np.sum(probabilities * probabilities, axis = -1)
+
+def _count_probabilities(counts):
+    """
+    Converts each row of label counts into label probabilities.
+
+    Rows without any counts have a probability of zero for every label.
+
+    :param counts: an array whose last axis holds the count of each label
+
+    :return: the probability of each label in each row
+    """
+
+    counts = np.asarray(counts, dtype = float)
+    totals = np.sum(counts, axis = -1, keepdims = True)
+
+    return np.divide(counts, totals, out = np.zeros_like(counts), where = totals != 0)
+
+# the most combined codes counted by one bincount when counting the labels of
+# feature values
+COUNT_BLOCK_SIZE = 2 ** 22
+
+# the metrics that can be calculated from label counts, which lets trees be
+# trained on encoded data
+COUNT_METRICS = {
+    entropy: entropy_of_counts,
+    gini_index: gini_index_of_counts
+}
+
 def information_gain(data, split_feature_name, label_feature_name, metric):
     """
     Calculate the information gain using the given metric.
@@ -104,6 +162,8 @@ def id3(data, available_feature_names, label_feature_name, max_depth, metric):
     # cannot give us any more information
     available_feature_names = set(feature for feature in available_feature_names if len(data[feature].unique()) > 1)
 
+    instrumentation.count("id3.nodes")
+
     # limit the depth of the tree
     if max_depth == 0:
         return LabelNode(data[label_feature_name].mode()[0])
@@ -112,7 +172,8 @@ def id3(data, available_feature_names, label_feature_name, max_depth, metric):
     if len(data[label_feature_name].unique()) <= 1:
         return LabelNode(data.iloc[0][label_feature_name])
 
-    split_feature_name = get_best_split_feature_name(data, available_feature_names, label_feature_name, metric)
+    with instrumentation.timer("id3.split_search"):
+        split_feature_name = get_best_split_feature_name(data, available_feature_names, label_feature_name, metric)
     remaining_feature_names = set(feature for feature in available_feature_names if feature != split_feature_name)
 
     most_common_label = data[label_feature_name].mode()[0]
@@ -125,16 +186,734 @@ def id3(data, available_feature_names, label_feature_name, max_depth, metric):
     return root
 
 
+class EncodedData:
+    """
+    Data with every feature and the label factorized to integer codes.
+
+    codes has one row per feature. The codes of a categorical feature index
+    into its array of categories. Numeric features are binned instead, and
+    their codes are bin numbers, where bin k holds the values greater than
+    thresholds[k - 1] and at most thresholds[k]. The label codes index into
+    classes. Categories and classes are sorted, so the lowest code of a tie is
+    the smallest value.
+    """
+
+    def __init__(self, feature_names, codes, categories, thresholds, labels, classes):
+        self.feature_names = feature_names
+        self.codes = codes
+        self.categories = categories
+        self.thresholds = thresholds
+        self.labels = labels
+        self.classes = classes
+
+        self.category_counts = np.array([len(feature_categories) for feature_categories in categories])
+
+def encode_data(data, feature_names, label_feature_name, *, numeric_feature_names = (), bins = 256):
+    """
+    Factorizes the given features and label of a data frame to integer codes.
+
+    Numeric features are binned at their quantiles, with every distinct value
+    getting its own bin if there are few enough of them. Codes are stored in
+    the smallest integer type that fits every feature, so with at most 256
+    bins and categories they take a single byte.
+
+    :param data: the data to encode
+    :param feature_names: the names of the features to encode
+    :param label_feature_name: the name of the label feature
+    :param numeric_feature_names: the names of features to bin (default none)
+    :param bins: the maximum number of bins for numeric features (default 256)
+
+    :return: the encoded data
+    """
+
+    feature_codes = []
+    categories = []
+    thresholds = []
+
+    for feature_name in feature_names:
+        if feature_name in numeric_feature_names:
+            codes, feature_thresholds = _bin_numeric(data[feature_name], bins)
+            feature_categories = np.arange(len(feature_thresholds) + 1)
+        else:
+            codes, feature_categories = pd.factorize(data[feature_name], sort = True, use_na_sentinel = False)
+            feature_thresholds = None
+
+        feature_codes.append(codes)
+        categories.append(np.asarray(feature_categories))
+        thresholds.append(feature_thresholds)
+
+    max_category_count = max((len(feature_categories) for feature_categories in categories), default = 1)
+    codes = np.empty((len(feature_names), len(data)), dtype = np.min_scalar_type(max_category_count - 1))
+
+    for index, feature_code in enumerate(feature_codes):
+        codes[index] = feature_code
+
+    labels, classes = pd.factorize(data[label_feature_name], sort = True, use_na_sentinel = False)
+
+    return EncodedData(list(feature_names), codes, categories, thresholds, labels, np.asarray(classes))
+
+def _bin_numeric(values, bins):
+    """
+    Bins numeric values at their quantiles.
+
+    Missing values are placed in the last bin.
+
+    :param values: the values to bin
+    :param bins: the maximum number of bins
+
+    :return: the bin of each value
+    :return: the upper threshold of every bin except the last
+    """
+
+    values = np.asarray(values, dtype = float)
+    present_values = values[~np.isnan(values)]
+    distinct_values = np.unique(present_values)
+
+    if len(distinct_values) <= bins:
+        thresholds = distinct_values[:-1]
+    else:
+        # quantiles of every value rather than of the distinct values, so bins
+        # hold similar numbers of rows, and repeated values share a threshold
+        thresholds = np.unique(np.quantile(present_values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+    return np.searchsorted(thresholds, values, side = "left"), thresholds
+
+def feature_label_counts(encoded, rows, labels, features):
+    """
+    Counts the labels of every value of the given features with a bincount
+    per block of features.
+
+    The counts of every feature are stacked, so the counts for feature i start
+    at row offsets[i]. Blocks hold as many features as fit in COUNT_BLOCK_SIZE
+    combined codes, which bounds the memory used however many rows and
+    features there are.
+
+    :param encoded: the encoded data
+    :param rows: the rows to count
+    :param labels: the label codes of the rows
+    :param features: the indices of the features to count
+
+    :return: a (values x classes) array of label counts
+    :return: the offset of each feature's values
+    """
+
+    features = np.asarray(features)
+    class_count = len(encoded.classes)
+    category_counts = encoded.category_counts[features]
+
+    offsets = np.zeros(len(features), dtype = np.int64)
+    offsets[1:] = np.cumsum(category_counts)[:-1]
+
+    value_count = int(np.sum(category_counts))
+    counts = np.zeros((value_count, class_count), dtype = np.int64)
+
+    block_size = max(1, COUNT_BLOCK_SIZE // max(len(rows), 1))
+
+    for start in range(0, len(features), block_size):
+        end = min(start + block_size, len(features))
+        first_value = offsets[start]
+        last_value = offsets[end - 1] + category_counts[end - 1]
+
+        combined = encoded.codes[np.ix_(features[start:end], rows)] + (offsets[start:end, None] - first_value)
+        combined *= class_count
+        combined += labels
+
+        block_counts = np.bincount(combined.ravel(), minlength = (last_value - first_value) * class_count)
+        counts[first_value:last_value] = block_counts.reshape((-1, class_count))
+
+    return counts, offsets
+
+def id3_encoded(encoded, rows, available_features, max_depth, count_metric, *, parallel = None, max_features = None, rng = None):
+    """
+    Runs the ID3 algorithm on encoded data.
+
+    The label counts of every value of every available feature are found with
+    a single bincount, and subsets are passed down as arrays of row indices.
+
+    Categorical features split into one child per value and are then used up.
+    Numeric features split in two at the bin threshold with the highest gain,
+    found from cumulative label counts over the bins, and can be split on again
+    further down the tree.
+
+    :param encoded: the encoded data
+    :param rows: the indices of the rows to analyze
+    :param available_features: the indices of features that are available for decisions
+    :param max_depth: the maximum depth of the tree
+    :param count_metric: the metric to use when calculating information gain, calculated from label counts
+    :param parallel: an optional ParallelBuild to share the work with
+    :param max_features: the number of randomly chosen features to consider at each split, or None for all of them
+    :param rng: the numpy random generator used to choose features
+
+    :return: the root of a decision tree
+    """
+
+    instrumentation.count("id3.nodes")
+
+    labels = encoded.labels[rows]
+    label_counts = np.bincount(labels, minlength = len(encoded.classes))
+    most_common_label = encoded.classes[np.argmax(label_counts)]
+
+    # limit the depth of the tree, and stop if the data only has one label
+    if max_depth == 0 or np.count_nonzero(label_counts) <= 1 or len(available_features) == 0:
+        return LabelNode(most_common_label)
+
+    candidate_features = available_features
+    if max_features is not None and len(available_features) > max_features:
+        candidate_features = np.sort(rng.choice(available_features, max_features, replace = False))
+
+    if parallel is not None:
+        gains, split_bins, present_value_counts = parallel.split_gains(encoded, rows, labels, label_counts,
+                                                                       candidate_features, count_metric)
+    else:
+        gains, split_bins, present_value_counts = split_gains(encoded, rows, labels, label_counts,
+                                                              candidate_features, count_metric)
+
+    # if none of the chosen features can be split on, fall back to all of them
+    if np.all(gains == -np.inf) and len(candidate_features) < len(available_features):
+        candidate_features = available_features
+        gains, split_bins, present_value_counts = split_gains(encoded, rows, labels, label_counts,
+                                                              candidate_features, count_metric)
+
+    if np.all(gains == -np.inf):
+        return LabelNode(most_common_label)
+
+    split_index = np.argmax(gains)
+    split_feature = candidate_features[split_index]
+    split_codes = encoded.codes[split_feature, rows]
+
+    # if a feature only has one unique value we should ignore it because it
+    # cannot give us any more information
+    constant_features = candidate_features[present_value_counts <= 1]
+    remaining_features = available_features[~np.isin(available_features, constant_features)]
+
+    if parallel is not None:
+        build = lambda subset, features: parallel.build(encoded, subset, features, max_depth - 1, count_metric)
+    else:
+        build = lambda subset, features: id3_encoded(encoded, subset, features, max_depth - 1, count_metric,
+                                                     max_features = max_features, rng = rng)
+
+    if encoded.thresholds[split_feature] is not None:
+        split_bin = split_bins[split_index]
+
+        root = ThresholdNode(encoded.feature_names[split_feature], encoded.thresholds[split_feature][split_bin], most_common_label)
+        root.less_or_equal = build(rows[split_codes <= split_bin], remaining_features)
+        root.greater = build(rows[split_codes > split_bin], remaining_features)
+
+        return root
+
+    remaining_features = remaining_features[remaining_features != split_feature]
+
+    root = DecisionNode(encoded.feature_names[split_feature], most_common_label)
+
+    subset_sizes = np.bincount(split_codes, minlength = encoded.category_counts[split_feature])
+    subset_ends = np.cumsum(subset_sizes)
+    sorted_rows = rows[np.argsort(split_codes, kind = "stable")]
+
+    for code in np.flatnonzero(subset_sizes):
+        subset = sorted_rows[subset_ends[code] - subset_sizes[code]:subset_ends[code]]
+        feature_value = encoded.categories[split_feature][code]
+
+        root.decisions[feature_value] = build(subset, remaining_features)
+
+    return root
+
+def split_gains(encoded, rows, labels, label_counts, features, count_metric):
+    """
+    Calculates the information gain of splitting on each of the given features.
+
+    Features with only one value present cannot be split on, and have a gain of
+    negative infinity.
+
+    :param encoded: the encoded data
+    :param rows: the indices of the rows to analyze
+    :param labels: the label codes of the rows
+    :param label_counts: the total count of each label
+    :param features: the indices of the features to analyze
+    :param count_metric: the metric to use when calculating information gain, calculated from label counts
+
+    :return: the information gain of each feature
+    :return: the last bin on the lower side of the best threshold of each numeric feature
+    :return: the number of values of each feature present in the rows
+    """
+
+    with instrumentation.timer("id3.split_search"):
+        counts, offsets = feature_label_counts(encoded, rows, labels, features)
+        value_totals = np.sum(counts, axis = 1)
+        metric_value = count_metric(label_counts)
+
+        weighted_metrics = value_totals / len(rows) * count_metric(counts)
+        gains = metric_value - np.add.reduceat(weighted_metrics, offsets)
+
+        present_value_counts = np.add.reduceat(value_totals > 0, offsets)
+        gains[present_value_counts <= 1] = -np.inf
+
+        split_bins = np.zeros(len(features), dtype = np.int64)
+
+        for index, feature in enumerate(features):
+            if encoded.thresholds[feature] is not None and present_value_counts[index] > 1:
+                feature_counts = counts[offsets[index]:offsets[index] + encoded.category_counts[feature]]
+                gains[index], split_bins[index] = _best_threshold(feature_counts, label_counts, metric_value, count_metric)
+
+    return gains, split_bins, present_value_counts
+
+def _best_threshold(bin_counts, label_counts, metric_value, count_metric):
+    """
+    Finds the bin threshold of a numeric feature with the highest information
+    gain.
+
+    :param bin_counts: a (bins x classes) array of label counts
+    :param label_counts: the total count of each label
+    :param metric_value: the metric of the unsplit data
+    :param count_metric: the metric to use when calculating information gain
+
+    :return: the information gain of the best split
+    :return: the last bin on the lower side of the best split
+    """
+
+    lower_counts = np.cumsum(bin_counts, axis = 0)[:-1]
+    upper_counts = label_counts - lower_counts
+
+    lower_totals = np.sum(lower_counts, axis = 1)
+    upper_totals = np.sum(upper_counts, axis = 1)
+    total = lower_totals[0] + upper_totals[0]
+
+    expected_metrics = (lower_totals * count_metric(lower_counts) + upper_totals * count_metric(upper_counts)) / total
+    gains = metric_value - expected_metrics
+
+    # both sides of a split need data
+    gains[(lower_totals == 0) | (upper_totals == 0)] = -np.inf
+    split_bin = np.argmax(gains)
+
+    return gains[split_bin], split_bin
+
+
+def train_encoded(encoded, max_depth, count_metric, *, n_jobs = 1, min_parallel_rows = 10000):
+    """
+    Trains a decision tree on all of the rows and features of encoded data.
+
+    With more than one job, the encoded data is put in shared memory. Nodes
+    with more rows than one job's share evaluate their features on a thread
+    pool, subtrees with fewer are built by a process pool, and subtrees with
+    fewer than min_parallel_rows rows are built serially.
+
+    :param encoded: the encoded data
+    :param max_depth: the maximum depth of the tree
+    :param count_metric: the metric to use when calculating information gain, calculated from label counts
+    :param n_jobs: the number of threads and processes to build with (default 1)
+    :param min_parallel_rows: the fewest rows a subtree needs to be built in parallel (default 10000)
+
+    :return: the root of a decision tree
+    """
+
+    rows = np.arange(len(encoded.labels))
+    features = np.arange(len(encoded.feature_names))
+
+    if n_jobs <= 1:
+        return id3_encoded(encoded, rows, features, max_depth, count_metric)
+
+    with SharedArrays() as shared:
+        shared.add("codes", encoded.codes)
+        shared.add("labels", encoded.labels)
+
+        initargs = (shared.specs, encoded.feature_names, encoded.categories, encoded.thresholds, encoded.classes)
+
+        with multiprocessing.Pool(n_jobs, initializer = _attach_encoded_data, initargs = initargs) as process_pool, \
+             ThreadPoolExecutor(n_jobs) as thread_pool:
+            parallel = ParallelBuild(process_pool, thread_pool, n_jobs,
+                                     split_rows = len(rows) // n_jobs,
+                                     min_rows = min_parallel_rows)
+
+            root = id3_encoded(encoded, rows, features, max_depth, count_metric, parallel = parallel)
+            return parallel.resolve(root)
+
+
+class ParallelBuild:
+    """
+    Shares the work of building a decision tree between threads and processes.
+
+    Worker processes must have been initialized with _attach_encoded_data.
+    """
+
+    def __init__(self, process_pool, thread_pool, n_jobs, *, split_rows, min_rows):
+        self.process_pool = process_pool
+        self.thread_pool = thread_pool
+        self.n_jobs = n_jobs
+        self.split_rows = split_rows
+        self.min_rows = min_rows
+
+    def split_gains(self, encoded, rows, labels, label_counts, features, count_metric):
+        """
+        Calculates split_gains, evaluating chunks of features concurrently when
+        there are enough rows.
+        """
+
+        if len(rows) < self.min_rows or len(features) < 2:
+            return split_gains(encoded, rows, labels, label_counts, features, count_metric)
+
+        chunks = np.array_split(features, min(self.n_jobs, len(features)))
+        results = list(self.thread_pool.map(lambda chunk: split_gains(encoded, rows, labels, label_counts, chunk, count_metric), chunks))
+
+        return tuple(np.concatenate(result) for result in zip(*results))
+
+    def build(self, encoded, rows, available_features, max_depth, count_metric):
+        """
+        Builds a subtree, either here, or by handing it to a worker process.
+
+        Subtrees handed to a worker are returned as pending nodes, which are
+        replaced by resolve.
+        """
+
+        if len(rows) > self.split_rows:
+            return id3_encoded(encoded, rows, available_features, max_depth, count_metric, parallel = self)
+
+        if len(rows) < self.min_rows:
+            return id3_encoded(encoded, rows, available_features, max_depth, count_metric)
+
+        result = self.process_pool.apply_async(_build_subtree, (rows, available_features, max_depth, count_metric))
+        return _PendingNode(result)
+
+    def resolve(self, node):
+        """
+        Waits for every pending node in a tree and replaces it with its subtree.
+
+        :param node: the root of the tree
+
+        :return: the root of the resolved tree
+        """
+
+        if isinstance(node, _PendingNode):
+            return node.result.get()
+
+        if isinstance(node, DecisionNode):
+            for feature_value, child in node.decisions.items():
+                node.decisions[feature_value] = self.resolve(child)
+
+        if isinstance(node, ThresholdNode):
+            node.less_or_equal = self.resolve(node.less_or_equal)
+            node.greater = self.resolve(node.greater)
+
+        return node
+
+
+class _PendingNode:
+    def __init__(self, result):
+        self.result = result
+
+
+_worker_encoded = None
+
+def _attach_encoded_data(specs, feature_names, categories, thresholds, classes):
+    """
+    Attaches shared encoded data in a worker process.
+    """
+
+    global _worker_encoded
+
+    attach_shared_arrays(specs)
+    arrays = get_shared_arrays()
+
+    _worker_encoded = EncodedData(feature_names, arrays["codes"], categories, thresholds, arrays["labels"], classes)
+
+def _build_subtree(rows, available_features, max_depth, count_metric):
+    """
+    Builds a subtree of the shared encoded data in a worker process.
+    """
+
+    return id3_encoded(_worker_encoded, rows, available_features, max_depth, count_metric)
+
+
+def _category_key(value):
+    """
+    Gets the key of a category or class in a dictionary, which is the same for
+    every missing value, as NaN is not equal to itself.
+    """
+
+    return _MISSING_KEY if pd.isna(value) else value
+
+# the key of every missing category or class
+_MISSING_KEY = object()
+
+class FlatTree:
+    """
+    A decision tree flattened into parallel arrays, which can route every row
+    of a data frame through the tree at once.
+
+    Node 0 is the root. For each node, features holds the index of the feature
+    it splits on, or -1 for a leaf, and labels holds the index of its label, or
+    its most common label for a split node. Threshold nodes go to
+    lower_children when a value is at most their threshold, and to
+    upper_children otherwise. Categorical nodes have a table of children
+    starting at child_offsets, indexed by the code of a value in the feature's
+    categories, where -1 means the value was not seen in training. Features
+    split by threshold nodes have no categories.
+    """
+
+    def __init__(self, root, classes = None):
+        """
+        :param root: the root of the tree
+        :param classes: the classes the labels of the tree are from, which sets the type of the predictions
+                        (default the labels in the tree)
+        """
+
+        self.feature_names = []
+        self.categories = []
+
+        feature_indices = dict()
+        class_indices = dict()
+
+        if classes is not None:
+            for class_value in classes:
+                class_indices.setdefault(_category_key(class_value), len(class_indices))
+
+        nodes = [root]
+        for node in nodes:
+            if isinstance(node, DecisionNode):
+                nodes.extend(node.decisions.values())
+            elif isinstance(node, ThresholdNode):
+                nodes.extend([node.less_or_equal, node.greater])
+
+        node_indices = {id(node): index for index, node in enumerate(nodes)}
+
+        self.features = np.full(len(nodes), -1, dtype = np.int64)
+        self.labels = np.zeros(len(nodes), dtype = np.int64)
+        self.thresholds = np.full(len(nodes), np.nan)
+        self.lower_children = np.full(len(nodes), -1, dtype = np.int64)
+        self.upper_children = np.full(len(nodes), -1, dtype = np.int64)
+        self.child_offsets = np.zeros(len(nodes), dtype = np.int64)
+
+        # the categories of each feature are every value any node splits on
+        category_indices = []
+        for node in nodes:
+            if isinstance(node, (DecisionNode, ThresholdNode)) and node.feature_name not in feature_indices:
+                feature_indices[node.feature_name] = len(self.feature_names)
+                self.feature_names.append(node.feature_name)
+                self.categories.append([])
+                category_indices.append(dict())
+
+            if isinstance(node, DecisionNode):
+                feature = feature_indices[node.feature_name]
+
+                for feature_value in node.decisions:
+                    key = _category_key(feature_value)
+
+                    if key not in category_indices[feature]:
+                        category_indices[feature][key] = len(self.categories[feature])
+                        self.categories[feature].append(feature_value)
+
+        child_tables = []
+        child_table_size = 0
+        class_values = []
+
+        for index, node in enumerate(nodes):
+            label = node.label if isinstance(node, LabelNode) else node.most_common_label
+            key = _category_key(label)
+
+            if key not in class_indices:
+                if classes is not None:
+                    raise Exception(f"The label {label!r} is not one of the classes")
+
+                class_indices[key] = len(class_indices)
+                class_values.append(label)
+
+            self.labels[index] = class_indices[key]
+
+            if isinstance(node, LabelNode):
+                continue
+
+            self.features[index] = feature_indices[node.feature_name]
+
+            if isinstance(node, ThresholdNode):
+                self.thresholds[index] = node.threshold
+                self.lower_children[index] = node_indices[id(node.less_or_equal)]
+                self.upper_children[index] = node_indices[id(node.greater)]
+            else:
+                feature_categories = category_indices[self.features[index]]
+
+                child_table = np.full(len(feature_categories), -1, dtype = np.int64)
+                for feature_value, child in node.decisions.items():
+                    child_table[feature_categories[_category_key(feature_value)]] = node_indices[id(child)]
+
+                self.child_offsets[index] = child_table_size
+                child_tables.append(child_table)
+                child_table_size += len(child_table)
+
+        self.child_table = np.concatenate(child_tables) if len(child_tables) > 0 else np.zeros(0, dtype = np.int64)
+
+        # without the classes, their type is inferred from the labels like the
+        # type of a data frame column
+        self.classes = np.asarray(classes) if classes is not None else pd.Index(class_values).to_numpy()
+
+    def classify(self, data):
+        """
+        Classifies every row of a data frame.
+
+        :param data: the data to classify
+
+        :return: an array of predictions
+        """
+
+        return self.classes[self.route(data)]
+
+    def route(self, data):
+        """
+        Finds the index in classes of the prediction for every row of a data
+        frame.
+
+        All rows move down one level of the tree at a time, with each level
+        handled by vectorized indexing for each feature.
+
+        :param data: the data to classify
+
+        :return: an array of class indices
+        """
+
+        columns = [self._encode_column(data, feature) for feature in range(len(self.feature_names))]
+
+        results = np.zeros(len(data), dtype = np.int64)
+        nodes = np.zeros(len(data), dtype = np.int64)
+        rows = np.arange(len(data))
+
+        while len(rows) > 0:
+            features = self.features[nodes]
+            next_nodes = np.full(len(rows), -1, dtype = np.int64)
+
+            for feature in np.unique(features[features >= 0]):
+                selected = np.flatnonzero(features == feature)
+                selected_nodes = nodes[selected]
+                values = columns[feature][rows[selected]]
+
+                if len(self.categories[feature]) == 0:
+                    lower = values <= self.thresholds[selected_nodes]
+                    next_nodes[selected] = np.where(lower, self.lower_children[selected_nodes], self.upper_children[selected_nodes])
+                else:
+                    known = values >= 0
+                    table_indices = self.child_offsets[selected_nodes[known]] + values[known]
+                    next_nodes[selected[known]] = self.child_table[table_indices]
+
+            # rows at a leaf, or with a value that was not seen in training,
+            # take the label of their current node
+            finished = next_nodes == -1
+            results[rows[finished]] = self.labels[nodes[finished]]
+
+            rows = rows[~finished]
+            nodes = next_nodes[~finished]
+
+        return results
+
+    def _encode_column(self, data, feature):
+        """
+        Gets the values of a feature to route on.
+
+        Categorical features are encoded as the index of each value in the
+        feature's categories, or -1 if it is not one of them.
+
+        :param data: the data to classify
+        :param feature: the index of the feature
+
+        :return: an array of values
+        """
+
+        column = data[self.feature_names[feature]]
+
+        if len(self.categories[feature]) == 0:
+            return np.asarray(column, dtype = float)
+
+        return pd.Index(self.categories[feature]).get_indexer(column)
+
+
 class DecisionTree:
+    # cross validation orders candidates by this hyperparameter when warm
+    # starting, so a candidate can reuse the tree of the one before it
+    warm_start_parameter = "max_depth"
+
     def __init__(self, label_name):
         self.label_name = label_name
+        self._warm_start_state = None
+
+    def train(self, data, *, max_depth = -1, metric = entropy, numeric_feature_names = (), bins = 256, n_jobs = 1,
+              warm_start = False):
+        """
+        Trains a decision tree using the given data.
+
+        Numeric features are split in two at a threshold rather than into one
+        child per value. Their values are binned at quantiles, and only bin
+        boundaries are considered as thresholds.
+
+        When warm starting, the encoded data and the deepest tree trained on the
+        same data frame are kept. Training again with the same options reuses
+        the encoding, and a smaller max_depth cuts the kept tree short rather
+        than building a new one. This gives the same tree because ID3 chooses
+        each split without looking at the splits below it. The data frame must
+        not be changed in between.
+
+        :param data: the data to use in training
+        :param max_depth: the maximum depth of the tree, or -1 for no limit (default -1)
+        :param metric: the metric to use when calculating information gain (default entropy)
+        :param numeric_feature_names: the names of features to split with thresholds (default none)
+        :param bins: the maximum number of bins for numeric features (default 256)
+        :param n_jobs: the number of threads and processes to build the tree with (default 1)
+        :param warm_start: reuse the encoding and tree of earlier calls to train if possible (default False)
+        """
+
+        feature_names = [feature_name for feature_name in data.columns if feature_name != self.label_name]
+        self._flat_tree = None
+
+        # metrics that can be calculated from label counts can use the much
+        # faster encoded training
+        if metric in COUNT_METRICS:
+            options = (tuple(feature_names), frozenset(numeric_feature_names), bins, metric)
+
+            state = self._warm_start_state
+            if not warm_start or state is None or state.data is not data or state.options != options:
+                encoded = encode_data(data, feature_names, self.label_name,
+                                      numeric_feature_names = set(numeric_feature_names),
+                                      bins = bins)
+
+                state = _WarmStartState(data, options, encoded)
+
+            if state.covers(max_depth):
+                self._root = _truncate(state.root, max_depth)
+            else:
+                with instrumentation.timer("id3"):
+                    self._root = train_encoded(state.encoded, max_depth, COUNT_METRICS[metric], n_jobs = n_jobs)
+
+                state.max_depth, state.root = max_depth, self._root
+
+            self._classes = state.encoded.classes
+
+            # the data is only kept while it may be needed to warm start
+            self._warm_start_state = state if warm_start else None
+        elif len(numeric_feature_names) > 0:
+            raise Exception("Numeric features can only be used with metrics in COUNT_METRICS")
+        else:
+            with instrumentation.timer("id3"):
+                self._root = id3(data, set(feature_names), self.label_name, max_depth, metric)
+
+            self._classes = None
+
+    def warm_start_order(self, max_depth):
+        """
+        :param max_depth: a maximum depth
 
-    def train(self, data, *, max_depth = -1, metric = entropy):
-        available_feature_names = {feature_name for feature_name in data.columns if feature_name != self.label_name}
-        self._root = id3(data, available_feature_names, self.label_name, max_depth, metric)
+        :return: a key that sorts candidates so the deepest tree is trained first
+        """
+
+        return -math.inf if max_depth == -1 else -max_depth
+
+    def compile(self):
+        """
+        Flattens the trained tree into arrays for vectorized prediction.
+
+        This happens automatically the first time the tree predicts.
+        """
+
+        self._flat_tree = FlatTree(self._root, getattr(self, "_classes", None))
 
     def predict(self, data, *evaluation_metrics):
-        predictions = pd.Series(self._root.classify(row) for _, row in data.iterrows())
+        if getattr(self, "_flat_tree", None) is None:
+            self.compile()
+
+        predictions = pd.Series(self._flat_tree.classify(data))
         labels = data[self.label_name].reset_index(drop = True)
 
         if len(evaluation_metrics) == 0:
@@ -149,6 +928,58 @@ class DecisionTree:
 
         return evaluate(labels, predictions, *evaluation_metrics)
 
+class _WarmStartState:
+    """
+    The encoding of a data frame, and the deepest tree trained from it.
+    """
+
+    def __init__(self, data, options, encoded):
+        self.data = data
+        self.options = options
+        self.encoded = encoded
+
+        self.max_depth = None
+        self.root = None
+
+    def covers(self, max_depth):
+        """
+        :return: whether or not a tree of the given maximum depth can be cut from the kept tree
+        """
+
+        if self.root is None:
+            return False
+
+        return self.max_depth == -1 or (max_depth != -1 and max_depth <= self.max_depth)
+
+def _truncate(node, max_depth):
+    """
+    Cuts a tree short at the given depth, replacing the nodes at that depth with
+    their most common label.
+
+    :param node: the root of the tree
+    :param max_depth: the maximum depth of the cut tree, or -1 for no limit
+
+    :return: the root of the cut tree, which shares unchanged subtrees
+    """
+
+    if max_depth == -1 or isinstance(node, LabelNode):
+        return node
+
+    if max_depth == 0:
+        return LabelNode(node.most_common_label)
+
+    if isinstance(node, ThresholdNode):
+        root = ThresholdNode(node.feature_name, node.threshold, node.most_common_label)
+        root.less_or_equal = _truncate(node.less_or_equal, max_depth - 1)
+        root.greater = _truncate(node.greater, max_depth - 1)
+
+        return root
+
+    root = DecisionNode(node.feature_name, node.most_common_label)
+    root.decisions = {value: _truncate(child, max_depth - 1) for value, child in node.decisions.items()}
+
+    return root
+
 class DecisionNode:
     def __init__(self, feature_name, most_common_label):
         self.feature_name = feature_name
@@ -165,6 +996,22 @@ class DecisionNode:
         return self.most_common_label
 
 
+class ThresholdNode:
+    def __init__(self, feature_name, threshold, most_common_label):
+        self.feature_name = feature_name
+        self.threshold = threshold
+        self.most_common_label = most_common_label
+
+        self.less_or_equal = None
+        self.greater = None
+
+    def classify(self, example):
+        if example[self.feature_name] <= self.threshold:
+            return self.less_or_equal.classify(example)
+
+        return self.greater.classify(example)
+
+
 class LabelNode:
     def __init__(self, label):
         self.label = label
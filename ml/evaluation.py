@@ -5,6 +5,11 @@ def evaluate(labels, predictions, *metrics):
     """
     Runs all of the given metrics on the labels and predictions.
 
+    When two or more metrics can be calculated from a confusion matrix, they
+    share a single confusion matrix, so the labels and predictions are only
+    compared once. A single metric, such as accuracy alone, is faster to call
+    on the labels and predictions directly.
+
     :param labels: the ground truth
     :param predictions: predicted labels
     :param metrics: the metrics to run
@@ -12,7 +17,383 @@ def evaluate(labels, predictions, *metrics):
     :return: the results of the given metrics
     """
 
-    return [metric(labels, predictions) for metric in metrics]
+    if sum(hasattr(metric, "confusion_metric") for metric in metrics) < 2:
+        return [metric(labels, predictions) for metric in metrics]
+
+    confusion = ConfusionMatrix.from_predictions(labels, predictions)
+
+    return [metric.confusion_metric(confusion) if hasattr(metric, "confusion_metric") else metric(labels, predictions)
+            for metric in metrics]
+
+
+def _factorize(values):
+    """
+    Finds the distinct values and the index of each value among them.
+
+    The distinct values are sorted when they can be. Values that cannot be
+    compared with each other, such as strings mixed with None for missing
+    labels, are kept in the order they first appear instead. Either way every
+    NaN is the same distinct value.
+
+    :param values: an array of values
+
+    :return: the distinct values
+    :return: the index of each value in the distinct values
+    """
+
+    try:
+        return np.unique(values, return_inverse = True)
+    except TypeError:
+        indices = dict()
+        distinct_values = []
+        codes = np.empty(len(values), dtype = np.int64)
+
+        for position, value in enumerate(values.tolist()):
+            key = value if value == value else _MISSING_KEY
+
+            if key not in indices:
+                indices[key] = len(distinct_values)
+                distinct_values.append(value)
+
+            codes[position] = indices[key]
+
+        classes = np.empty(len(distinct_values), dtype = object)
+        classes[:] = distinct_values
+
+        return classes, codes
+
+# the key of every NaN when factorizing values that cannot be sorted
+_MISSING_KEY = object()
+
+class ConfusionMatrix:
+    """
+    Counts how often each label was predicted as each other label.
+
+    counts[i, j] is the number of examples labeled classes[i] that were
+    predicted to be classes[j].
+
+    A confusion matrix can be built up incrementally with update, and the
+    matrices of separate chunks or workers can be combined with merge. The
+    metrics of the combined matrix are the same as those of the concatenated
+    labels and predictions.
+
+    NaN is not equal to itself, so as when comparing labels and predictions
+    with ==, a NaN label predicted as NaN is not counted as correct.
+    """
+
+    def __init__(self, classes = None, counts = None):
+        self.classes = classes if classes is not None else np.zeros(0)
+        self.counts = counts if counts is not None else np.zeros((0, 0), dtype = np.int64)
+
+        self._class_indices = {value: index for index, value in enumerate(self.classes.tolist())}
+        self._correct_counts = np.where(self.classes != self.classes, 0, np.diag(self.counts))
+
+    @classmethod
+    def from_predictions(cls, labels, predictions):
+        """
+        Builds a confusion matrix with a single bincount.
+
+        :param labels: the ground truth
+        :param predictions: predicted labels
+
+        :return: the confusion matrix of the labels and predictions
+        """
+
+        labels = np.asarray(labels)
+        predictions = np.asarray(predictions)
+
+        classes, codes = _factorize(np.concatenate([labels, predictions]))
+        label_codes, prediction_codes = codes[:len(labels)], codes[len(labels):]
+
+        class_count = len(classes)
+        counts = np.bincount(label_codes * class_count + prediction_codes, minlength = class_count * class_count)
+
+        return cls(classes, counts.reshape((class_count, class_count)))
+
+    def update(self, labels, predictions):
+        """
+        Adds the counts of more labels and predictions to this matrix.
+
+        :param labels: the ground truth
+        :param predictions: predicted labels
+
+        :return: this confusion matrix
+        """
+
+        return self.merge(ConfusionMatrix.from_predictions(labels, predictions))
+
+    def merge(self, other):
+        """
+        Adds the counts of another confusion matrix to this matrix.
+
+        :param other: the confusion matrix to add
+
+        :return: this confusion matrix
+        """
+
+        if len(other.classes) == 0:
+            return self
+
+        if len(self.classes) == 0:
+            classes, codes = other.classes, np.arange(len(other.classes))
+        else:
+            classes, codes = _factorize(np.concatenate([self.classes, other.classes]))
+
+        counts = np.zeros((len(classes), len(classes)), dtype = np.int64)
+
+        for matrix, indices in ((self, codes[:len(self.classes)]), (other, codes[len(self.classes):])):
+            counts[np.ix_(indices, indices)] += matrix.counts
+
+        self.__init__(classes, counts)
+        return self
+
+    def evaluate(self, *metrics):
+        """
+        Runs the given metrics on this confusion matrix.
+
+        Only metrics that can be calculated from a confusion matrix can be used.
+
+        :param metrics: the metrics to run
+
+        :return: the results of the given metrics
+        """
+
+        for metric in metrics:
+            if not hasattr(metric, "confusion_metric"):
+                raise Exception(f"{metric} cannot be calculated from a confusion matrix")
+
+        return [metric.confusion_metric(self) for metric in metrics]
+
+    def accuracy(self):
+        """
+        :return: the fraction of predictions that were correct
+        """
+
+        return np.sum(self._correct_counts) / np.sum(self.counts)
+
+    def precision(self, value):
+        """
+        :param value: the value to find the precision of
+
+        :return: the fraction of predictions of the value that were correct
+        """
+
+        if value not in self._class_indices:
+            return 0
+
+        index = self._class_indices[value]
+        guess_count = np.sum(self.counts[:, index])
+
+        if guess_count == 0:
+            return 0
+
+        return self._correct_counts[index] / guess_count
+
+    def recall(self, value):
+        """
+        :param value: the value to find the recall of
+
+        :return: the fraction of examples with the value that were predicted correctly
+        """
+
+        if value not in self._class_indices:
+            return 0
+
+        index = self._class_indices[value]
+        value_count = np.sum(self.counts[index, :])
+
+        if value_count == 0:
+            return 0
+
+        return self._correct_counts[index] / value_count
+
+    def fscore(self, value):
+        """
+        :param value: the value to find the F1 score of
+
+        :return: the F1 score of the predictions for the value
+        """
+
+        return _combine_fscore(self.precision(value), self.recall(value))
+
+    def class_precisions(self):
+        """
+        :return: the precision of every class
+        """
+
+        guess_counts = np.sum(self.counts, axis = 0)
+        return np.divide(self._correct_counts, guess_counts, out = np.zeros(len(self.classes)), where = guess_counts != 0)
+
+    def class_recalls(self):
+        """
+        :return: the recall of every class
+        """
+
+        value_counts = np.sum(self.counts, axis = 1)
+        return np.divide(self._correct_counts, value_counts, out = np.zeros(len(self.classes)), where = value_counts != 0)
+
+    def class_fscores(self):
+        """
+        :return: the F1 score of every class
+        """
+
+        precisions = self.class_precisions()
+        recalls = self.class_recalls()
+
+        totals = precisions + recalls
+        return np.divide(2 * precisions * recalls, totals, out = np.zeros(len(self.classes)), where = totals != 0)
+
+    def macro_precision(self):
+        """
+        :return: the average precision of every class
+        """
+
+        return np.mean(self.class_precisions())
+
+    def macro_recall(self):
+        """
+        :return: the average recall of every class
+        """
+
+        return np.mean(self.class_recalls())
+
+    def macro_fscore(self):
+        """
+        :return: the average F1 score of every class
+        """
+
+        return np.mean(self.class_fscores())
+
+    def micro_fscore(self):
+        """
+        Every example has exactly one label and prediction, so micro averaged
+        precision, recall, and F1 score are all equal to the accuracy.
+
+        :return: the F1 score of the pooled counts of every class
+        """
+
+        return self.accuracy()
+
+class ScoreHistogram:
+    """
+    Counts the scores of positive and negative examples in fixed width bins, so
+    that ranking metrics can be calculated over data seen in chunks.
+
+    Scores outside of the range are counted in the first or last bin. Scores
+    that share a bin are treated as ties, so the metrics are approximations
+    that improve with the number of bins.
+    """
+
+    def __init__(self, *, positive_value = 1, low = 0.0, high = 1.0, bins = 1000):
+        self.positive_value = positive_value
+        self.low = low
+        self.high = high
+
+        self.positive_counts = np.zeros(bins, dtype = np.int64)
+        self.negative_counts = np.zeros(bins, dtype = np.int64)
+
+    def update(self, labels, scores):
+        """
+        Adds the scores of more examples to this histogram.
+
+        :param labels: the ground truth
+        :param scores: the score of each example, where higher means more likely to be positive
+
+        :return: this histogram
+        """
+
+        bin_count = len(self.positive_counts)
+
+        bins = np.floor((np.asarray(scores, dtype = float) - self.low) / (self.high - self.low) * bin_count)
+        bins = np.clip(bins, 0, bin_count - 1).astype(np.int64)
+        positive = np.equal(labels, self.positive_value)
+
+        self.positive_counts += np.bincount(bins[positive], minlength = bin_count)
+        self.negative_counts += np.bincount(bins[~positive], minlength = bin_count)
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram with the same bins to this one.
+
+        :param other: the histogram to add
+
+        :return: this histogram
+        """
+
+        if (other.low, other.high, len(other.positive_counts)) != (self.low, self.high, len(self.positive_counts)):
+            raise Exception("Only histograms with the same bins can be merged")
+
+        self.positive_counts += other.positive_counts
+        self.negative_counts += other.negative_counts
+
+        return self
+
+    def roc_auc(self):
+        """
+        Determines the area under the ROC curve.
+
+        :return: the area under the ROC curve
+        """
+
+        true_positives, false_positives = self._cumulative_counts()
+
+        if true_positives[-1] == 0 or false_positives[-1] == 0:
+            return 0
+
+        true_positive_rates = true_positives / true_positives[-1]
+        false_positive_rates = false_positives / false_positives[-1]
+
+        # trapezoids give ties within a bin half credit
+        heights = (true_positive_rates[1:] + true_positive_rates[:-1]) / 2
+        return np.sum(np.diff(false_positive_rates) * heights)
+
+    def pr_auc(self):
+        """
+        Determines the area under the precision-recall curve as the average
+        precision at each threshold, weighted by the increase in recall.
+
+        :return: the area under the precision-recall curve
+        """
+
+        true_positives, false_positives = self._cumulative_counts()
+
+        if true_positives[-1] == 0:
+            return 0
+
+        predicted_positives = true_positives + false_positives
+        precisions = np.divide(true_positives, predicted_positives, out = np.ones(len(true_positives)), where = predicted_positives != 0)
+        recalls = true_positives / true_positives[-1]
+
+        return np.sum(np.diff(recalls) * precisions[1:])
+
+    def _cumulative_counts(self):
+        """
+        Counts the examples at or above each bin threshold, from the highest
+        threshold to the lowest.
+
+        :return: the true positives at each threshold, starting at zero
+        :return: the false positives at each threshold, starting at zero
+        """
+
+        true_positives = np.concatenate([[0], np.cumsum(self.positive_counts[::-1])])
+        false_positives = np.concatenate([[0], np.cumsum(self.negative_counts[::-1])])
+
+        return true_positives, false_positives
+
+def _confusion_metric(metric, confusion_metric):
+    """
+    Marks a metric as one that can be calculated from a confusion matrix.
+
+    :param metric: a function of labels and predictions
+    :param confusion_metric: the same metric as a function of a ConfusionMatrix
+
+    :return: the metric
+    """
+
+    metric.confusion_metric = confusion_metric
+    return metric
 
 def accuracy(labels, predictions):
     """
@@ -57,7 +438,8 @@ def precision_on(value):
     :return: a function taht determines the precision of given labels and predictions
     """
 
-    return lambda labels, predictions: _precision(value, labels, predictions)
+    return _confusion_metric(lambda labels, predictions: _precision(value, labels, predictions),
+                             lambda confusion: confusion.precision(value))
 
 def _precision(value, labels, predictions):
     """
@@ -98,7 +480,8 @@ def recall_on(value):
     :return: a function that determines the recall of given labels and predictions
     """
 
-    return lambda labels, predictions: _recall(value, labels, predictions)
+    return _confusion_metric(lambda labels, predictions: _recall(value, labels, predictions),
+                             lambda confusion: confusion.recall(value))
 
 def _recall(value, labels, predictions):
     """
@@ -135,7 +518,8 @@ def fscore_on(value):
     :return: a function that determines the fscore of given labels and predictions
     """
 
-    return lambda labels, predictions: _fscore(value, labels, predictions)
+    return _confusion_metric(lambda labels, predictions: _fscore(value, labels, predictions),
+                             lambda confusion: confusion.fscore(value))
 
 def _fscore(value, labels, predictions):
     """
@@ -151,7 +535,77 @@ def _fscore(value, labels, predictions):
     precision = _precision(value, labels, predictions)
     recall = _recall(value, labels, predictions)
 
+    return _combine_fscore(precision, recall)
+
+def _combine_fscore(precision, recall):
+    """
+    Determines the F1 score from a precision and recall.
+
+    :param precision: the precision
+    :param recall: the recall
+
+    :return: the F1 score
+    """
+
     if precision == 0 or recall == 0:
         return 0
 
     return 2 * ((precision * recall) / (precision + recall))
+
+def macro_precision(labels, predictions):
+    """
+    Determines the average precision of every class in the labels and
+    predictions.
+
+    :param labels: the ground truth
+    :param predictions: predicted labels
+
+    :return: the macro averaged precision
+    """
+
+    return ConfusionMatrix.from_predictions(labels, predictions).macro_precision()
+
+def macro_recall(labels, predictions):
+    """
+    Determines the average recall of every class in the labels and predictions.
+
+    :param labels: the ground truth
+    :param predictions: predicted labels
+
+    :return: the macro averaged recall
+    """
+
+    return ConfusionMatrix.from_predictions(labels, predictions).macro_recall()
+
+def macro_fscore(labels, predictions):
+    """
+    Determines the average F1 score of every class in the labels and
+    predictions.
+
+    :param labels: the ground truth
+    :param predictions: predicted labels
+
+    :return: the macro averaged F1 score
+    """
+
+    return ConfusionMatrix.from_predictions(labels, predictions).macro_fscore()
+
+def micro_fscore(labels, predictions):
+    """
+    Determines the F1 score of the pooled counts of every class, which is equal
+    to the accuracy.
+
+    :param labels: the ground truth
+    :param predictions: predicted labels
+
+    :return: the micro averaged F1 score
+    """
+
+    return ConfusionMatrix.from_predictions(labels, predictions).micro_fscore()
+
+_confusion_metric(accuracy, ConfusionMatrix.accuracy)
+_confusion_metric(error, lambda confusion: 1 - confusion.accuracy())
+_confusion_metric(macro_precision, ConfusionMatrix.macro_precision)
+_confusion_metric(macro_recall, ConfusionMatrix.macro_recall)
+_confusion_metric(macro_fscore, ConfusionMatrix.macro_fscore)
+_confusion_metric(micro_fscore, ConfusionMatrix.micro_fscore)
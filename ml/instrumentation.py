@@ -0,0 +1,182 @@
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+class Report:
+    """
+    Collects the counters, timings and series recorded while instrumentation
+    is enabled.
+
+    Counters are totals, such as the number of tree nodes built. Timings are
+    the total seconds and number of calls of a stage. Series keep every value
+    recorded in order, such as the mistakes made in each epoch.
+
+    An optional callback is called with the kind ("count", "time" or
+    "series"), name and value of every record as it is made.
+    """
+
+    def __init__(self, callback = None):
+        self.callback = callback
+
+        self.counters = dict()
+        self.timings = dict()
+        self.series = dict()
+
+        # trees build nodes on several threads
+        self._lock = threading.Lock()
+
+    def count(self, name, amount):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+        if self.callback is not None:
+            self.callback("count", name, amount)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            total, calls = self.timings.get(name, (0.0, 0))
+            self.timings[name] = (total + seconds, calls + 1)
+
+        if self.callback is not None:
+            self.callback("time", name, seconds)
+
+    def append(self, name, value):
+        with self._lock:
+            self.series.setdefault(name, []).append(value)
+
+        if self.callback is not None:
+            self.callback("series", name, value)
+
+    def as_dict(self):
+        """
+        Gets the report as a JSON serializable dictionary.
+
+        A counter named after a timing, such as read_libsvm.rows for the
+        read_libsvm timing, is also reported as a rate per second.
+
+        :return: a dictionary of the counters, timings, rates and series
+        """
+
+        with self._lock:
+            timings = {name: dict(seconds = total, calls = calls) for name, (total, calls) in self.timings.items()}
+
+            rates = dict()
+            for name, value in self.counters.items():
+                stage = name.rpartition(".")[0]
+
+                if stage in self.timings and self.timings[stage][0] > 0:
+                    rates[f"{name}_per_second"] = value / self.timings[stage][0]
+
+            return dict(counters = dict(self.counters),
+                        timings = timings,
+                        rates = rates,
+                        series = {name: list(values) for name, values in self.series.items()})
+
+    def __str__(self):
+        return json.dumps(self.as_dict(), indent = 2)
+
+
+# the reports being recorded to, innermost last, and whether there are any so
+# that the recording functions can return immediately when there are not
+_reports = []
+enabled = False
+
+def count(name, amount = 1):
+    """
+    Adds to a counter of every active report.
+
+    :param name: the name of the counter
+    :param amount: the amount to add (default 1)
+    """
+
+    if not enabled:
+        return
+
+    for report in _reports:
+        report.count(name, amount)
+
+def append(name, value):
+    """
+    Appends a value to a series of every active report.
+
+    :param name: the name of the series
+    :param value: the value to append
+    """
+
+    if not enabled:
+        return
+
+    for report in _reports:
+        report.append(name, value)
+
+# returned by timer when disabled, so that timing costs nothing
+_null_timer = contextlib.nullcontext()
+
+def timer(name):
+    """
+    Times a stage in a with statement, adding the time to every active report.
+
+    :param name: the name of the stage
+
+    :return: a context manager that times its body
+    """
+
+    if not enabled:
+        return _null_timer
+
+    return _timer(name)
+
+@contextlib.contextmanager
+def _timer(name):
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+
+        for report in _reports:
+            report.add_time(name, seconds)
+
+@contextlib.contextmanager
+def instrument(callback = None):
+    """
+    Records counters and timings while the context is active.
+
+    Records are added to the report of every active context, so nested
+    contexts each see what happens inside of them. Work done in other
+    processes, such as parallel cross validation, is not recorded.
+
+    :param callback: an optional function called with the kind, name and value of every record
+
+    :return: the Report being recorded to
+    """
+
+    global enabled
+
+    report = Report(callback)
+    _reports.append(report)
+    enabled = True
+
+    try:
+        yield report
+    finally:
+        _reports.remove(report)
+        enabled = len(_reports) > 0
+
+def _report_at_exit(report):
+    print(report, file = sys.stderr)
+
+# setting LEARNZ_INSTRUMENT records everything the process does, and writes
+# the report to stderr when it exits
+if os.environ.get("LEARNZ_INSTRUMENT", "0") not in ("", "0"):
+    _process_report = Report()
+    _reports.append(_process_report)
+    enabled = True
+
+    atexit.register(_report_at_exit, _process_report)
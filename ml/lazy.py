@@ -0,0 +1,87 @@
+import importlib
+import sys
+
+
+# pandas, scipy and numba take much longer to import than the rest of learnz,
+# so they are only imported by the code paths that use them. Data can only be
+# a data frame or a sparse matrix once pandas or scipy has been imported, so
+# the checks below never need to import them.
+
+def is_dataframe(data):
+    """
+    Checks whether or not the given data is a pandas data frame, without
+    importing pandas.
+    """
+
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(data, pandas.DataFrame)
+
+def is_csr_matrix(data):
+    """
+    Checks whether or not the given data is a scipy CSR matrix, without
+    importing scipy.
+    """
+
+    sparse = sys.modules.get("scipy.sparse")
+    return sparse is not None and isinstance(data, sparse.csr_matrix)
+
+def compile_when_called(function, fallback):
+    """
+    Wraps a function to be compiled with numba the first time it is called.
+
+    numba is imported on the first call, and if it is not installed the
+    fallback is used instead. Compiled functions are written with scalar loops,
+    which are much slower than a numpy fallback when they are interpreted, so
+    the function itself is never called without compiling it.
+
+    :param function: the function to compile
+    :param fallback: the function to use when numba is not installed
+
+    :return: a function that calls the compiled function or the fallback
+    """
+
+    implementation = None
+
+    def call(*arguments):
+        nonlocal implementation
+
+        if implementation is None:
+            try:
+                numba = importlib.import_module("numba")
+            except ImportError:
+                implementation = fallback
+            else:
+                implementation = numba.njit(cache = True)(function)
+
+        return implementation(*arguments)
+
+    return call
+
+def lazy_attributes(module_name, attributes):
+    """
+    Creates the module __getattr__ and __dir__ functions of PEP 562 that
+    import the modules of the given attributes when they are first used.
+
+    :param module_name: the name of the module the functions are for
+    :param attributes: the name of the module that defines each attribute, by attribute name
+
+    :return: the __getattr__ function
+    :return: the __dir__ function
+    """
+
+    module = sys.modules[module_name]
+
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+        value = getattr(importlib.import_module(attributes[name]), name)
+
+        # later lookups find the attribute without calling __getattr__
+        setattr(module, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(attributes))
+
+    return __getattr__, __dir__
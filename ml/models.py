@@ -1,2 +1,13 @@
-from learnz.ml.perceptron import Perceptron
-from learnz.ml.decision_tree import DecisionTree
+from learnz.ml.lazy import lazy_attributes
+
+
+# each model is imported when it is first used, so that using one model does
+# not import the dependencies of the others
+__all__ = ["Perceptron", "MulticlassPerceptron", "DecisionTree", "RandomForest"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "Perceptron": "learnz.ml.perceptron",
+    "MulticlassPerceptron": "learnz.ml.multiclass_perceptron",
+    "DecisionTree": "learnz.ml.decision_tree",
+    "RandomForest": "learnz.ml.random_forest"
+})
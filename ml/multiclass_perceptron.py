@@ -0,0 +1,210 @@
+import numpy as np
+import random
+
+from learnz.ml.evaluation import evaluate
+from learnz.ml.lazy import compile_when_called
+from learnz.ml.perceptron import _canonical_csr, _total_weights, shuffled_indices
+
+
+class MulticlassPerceptron:
+    def train(self, data, *, learning_rate = 1.0, averaged = True, epochs = 10):
+        """
+        Trains a multiclass perceptron using the given data.
+
+        One column of weights is kept for each class, and an example is
+        predicted as the class with the highest score. Labels can be any values
+        that numpy can sort.
+
+        :param data: the data to use in training
+        :param learning_rate: the learning rate of the perceptron (default 1.0)
+        :param averaged: use the average of all weights (default True)
+        :param epochs: the number of epochs to train for (default 10)
+        """
+
+        self.classes, self.weights = _train(data,
+                                            learning_rate = learning_rate,
+                                            averaged = averaged,
+                                            epochs = epochs)
+
+    def predict(self, data, *evaluation_metrics):
+        """
+        Make a prediction for each of the given examples.
+
+        :param data: the data to predict
+        :param evaluation_metrics: an optional list of evaluation metrics to apply
+
+        :return: predictions for each example
+        """
+
+        examples, labels = data
+        predictions = _predict(examples, self.weights, self.classes)
+
+        if len(evaluation_metrics) == 0:
+            return predictions
+
+        evaluations = evaluate(labels, predictions, *evaluation_metrics)
+        return predictions, evaluations
+
+    def evaluate(self, data, *evaluation_metrics):
+        """
+        Evaluates the model on the given examples with the provided metrics.
+
+        :param data: the data to predict
+        :param evaluation_metrics: a list of evaluation metrics to apply
+
+        :return: the results of the requested evaluations
+        """
+
+        examples, labels = data
+        predictions = _predict(examples, self.weights, self.classes)
+
+        return evaluate(labels, predictions, *evaluation_metrics)
+
+
+def _train(data, *, learning_rate, averaged, epochs):
+    """
+    Trains a multiclass perceptron using the given data.
+
+    :param data: the data to use in training
+    :param learning_rate: the learning rate of the perceptron
+    :param averaged: use the average of all weights
+    :param epochs: the number of epochs to train for
+
+    :return: the classes of the weight columns
+    :return: a (features x classes) weight matrix
+    """
+
+    from scipy.sparse import csr_matrix
+
+    x, y = data
+    x = _canonical_csr(csr_matrix(x))
+
+    classes, class_indices = np.unique(y, return_inverse = True)
+    num_examples, num_features = x.shape
+
+    weights = np.array([random.uniform(-0.01, 0.01) for _ in range(num_features * len(classes))])
+    weights = weights.reshape((num_features, len(classes)))
+
+    example_count = 0
+    update_totals = np.zeros_like(weights)
+
+    for epoch in range(epochs):
+        order = np.array(shuffled_indices(num_examples), dtype = np.int64)
+
+        example_count = _train_epoch(x.indptr, x.indices, x.data, class_indices, order, weights, update_totals,
+                                     learning_rate / (1 + epoch), averaged, example_count)
+
+    if averaged:
+        return classes, _total_weights(weights, update_totals, example_count) / example_count
+
+    return classes, weights
+
+def _train_epoch_numpy(indptr, indices, values, class_indices, order, weights, update_totals, learning_rate, averaged, example_count):
+    """
+    Runs one epoch of multiclass perceptron training over raw CSR arrays.
+
+    On a mistake only the columns of the true and predicted classes are updated,
+    and only in the rows of the features present in the example. The weights
+    and update totals are updated in place.
+
+    :param indptr: the CSR row pointers of the examples
+    :param indices: the CSR column indices of the examples
+    :param values: the CSR values of the examples
+    :param class_indices: the index of the class of each example
+    :param order: the order to visit the examples in
+    :param weights: the (features x classes) weights to train
+    :param update_totals: the sum of each update scaled by the number of examples that preceded it
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+    :param example_count: the number of examples seen before this epoch
+
+    :return: the number of examples seen after this epoch
+    """
+
+    for index in order:
+        start, end = indptr[index], indptr[index + 1]
+        example_indices = indices[start:end]
+        example_values = values[start:end]
+
+        prediction = np.argmax(example_values.dot(weights[example_indices]))
+        label = class_indices[index]
+
+        if prediction != label:
+            addition = learning_rate * example_values
+
+            weights[example_indices, label] += addition
+            weights[example_indices, prediction] -= addition
+
+            if averaged:
+                update_totals[example_indices, label] += example_count * addition
+                update_totals[example_indices, prediction] -= example_count * addition
+
+        example_count += 1
+
+    return example_count
+
+def _train_epoch_compiled(indptr, indices, values, class_indices, order, weights, update_totals, learning_rate, averaged, example_count):
+    """
+    Runs one epoch of multiclass perceptron training over raw CSR arrays.
+
+    This is the same as _train_epoch_numpy, but is written with scalar loops so
+    that it can be compiled with numba.
+
+    :param indptr: the CSR row pointers of the examples
+    :param indices: the CSR column indices of the examples
+    :param values: the CSR values of the examples
+    :param class_indices: the index of the class of each example
+    :param order: the order to visit the examples in
+    :param weights: the (features x classes) weights to train
+    :param update_totals: the sum of each update scaled by the number of examples that preceded it
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+    :param example_count: the number of examples seen before this epoch
+
+    :return: the number of examples seen after this epoch
+    """
+
+    scores = np.zeros(weights.shape[1])
+
+    for index in order:
+        start, end = indptr[index], indptr[index + 1]
+
+        scores[:] = 0.0
+        for position in range(start, end):
+            scores += values[position] * weights[indices[position]]
+
+        prediction = np.argmax(scores)
+        label = class_indices[index]
+
+        if prediction != label:
+            for position in range(start, end):
+                addition = learning_rate * values[position]
+
+                weights[indices[position], label] += addition
+                weights[indices[position], prediction] -= addition
+
+                if averaged:
+                    update_totals[indices[position], label] += example_count * addition
+                    update_totals[indices[position], prediction] -= example_count * addition
+
+        example_count += 1
+
+    return example_count
+
+_train_epoch = compile_when_called(_train_epoch_compiled, _train_epoch_numpy)
+
+def _predict(examples, weights, classes):
+    """
+    Makes a prediction for each of the given examples.
+
+    All of the examples are scored with a single matrix product.
+
+    :param examples: the examples to predict
+    :param weights: the (features x classes) weights to use in the prediction
+    :param classes: the classes of the weight columns
+
+    :return: predictions for each example
+    """
+
+    scores = examples.dot(weights)
+    return classes[np.argmax(np.asarray(scores), axis = 1)]
@@ -1,27 +1,118 @@
+import multiprocessing
 import numpy as np
 import random
-from scipy.sparse.csr import csr_matrix
 
+from learnz.ml import instrumentation
 from learnz.ml.evaluation import evaluate
+from learnz.ml.lazy import compile_when_called, is_csr_matrix
+from learnz.ml.persistence import load_arrays, save_arrays
+from learnz.ml.shared_memory import SharedArrays, attach_shared_arrays, get_shared_arrays
 
 
 class Perceptron:
-    def train(self, data, *, learning_rate = 1.0, decay_learning_rate = False, averaged = True, epochs = 10):
+    # cross validation orders candidates by this hyperparameter when warm
+    # starting, so a candidate can continue from the one before it
+    warm_start_parameter = "epochs"
+
+    def __init__(self):
+        self._training_state = None
+
+    def train(self, data, *, learning_rate = 1.0, decay_learning_rate = False, averaged = True, epochs = 10,
+              n_jobs = 1, parallel = "hogwild", warm_start = False, dtype = np.float64):
         """
         Trains a perceptron using the given data.
 
+        When training with more than one job each epoch is split into shards
+        that are trained in separate processes. With hogwild parallelism every
+        process updates the same shared weights without locking. With mixing
+        parallelism every process trains its own copy of the weights, and the
+        copies are averaged at the end of each epoch, which is deterministic.
+
+        When warm starting, if the last call to train used the same data and
+        hyperparameters with no more epochs, training continues from where it
+        stopped rather than starting over. Otherwise a new model is trained.
+
+        The weights are kept in the given dtype, which can be float32 to halve
+        their size when the data is read as float32 as well. The running totals
+        used for averaging are always kept in float64, as they grow with the
+        number of examples seen.
+
         :param data: the data to use in training
         :param learning_rate: the learning rate of the perceptron (default 1.0)
         :param decay_learning_rate: whether or not to decay the learning rate with each epoch (default False)
         :param averaged: use the average of all weights (default True)
         :param epochs: the number of epochs to train for (default 10)
+        :param n_jobs: the number of processes to train with (default 1)
+        :param parallel: either "hogwild" or "mixing" (default "hogwild")
+        :param warm_start: continue from the last call to train if possible (default False)
+        :param dtype: the type of the weights (default float64)
+        """
+
+        hyperparameters = (learning_rate, decay_learning_rate, averaged, n_jobs, parallel, np.dtype(dtype))
+
+        state = self._training_state
+        if not warm_start or state is None or state.data is not data or state.hyperparameters != hyperparameters or state.epoch > epochs:
+            state = None
+
+        self.weights, self._training_state = _train(data,
+                                                    learning_rate = learning_rate,
+                                                    decay_learning_rate = decay_learning_rate,
+                                                    averaged = averaged,
+                                                    epochs = epochs,
+                                                    n_jobs = n_jobs,
+                                                    parallel = parallel,
+                                                    state = state,
+                                                    dtype = dtype)
+
+        # the training state holds a second copy of the weights and the
+        # averaging totals, so it is only kept while it may be needed to warm
+        # start, and partial_fit rebuilds it from the weights otherwise
+        if not warm_start:
+            self._training_state = None
+        elif self._training_state is not None:
+            self._training_state.data = data
+            self._training_state.hyperparameters = hyperparameters
+
+    def warm_start_order(self, epochs):
+        """
+        :param epochs: a number of epochs
+
+        :return: a key that sorts candidates so fewer epochs are trained first
+        """
+
+        return epochs
+
+    def partial_fit(self, data, *, learning_rate = 1.0, averaged = True, dtype = np.float64):
+        """
+        Continues training the perceptron with one pass over the given data.
+
+        The data can either be a single (features, labels) batch or an iterable
+        of batches, such as the chunks from read_libsvm_chunks. The weights and
+        averaging state are kept between calls, so the first call starts a new
+        model and later calls keep training it. Multiple epochs can be trained
+        by calling this once per epoch.
+
+        A model without averaging state, such as a loaded model or one trained
+        without warm starting, keeps training from its weights, and averaging
+        starts over from them.
+
+        :param data: a batch or iterable of batches to train on
+        :param learning_rate: the learning rate of the perceptron (default 1.0)
+        :param averaged: use the average of all weights (default True)
+        :param dtype: the type of the weights of a new model (default float64)
         """
 
-        self.weights = _train(data,
-                              learning_rate = learning_rate,
-                              decay_learning_rate = decay_learning_rate,
-                              averaged = averaged,
-                              epochs = epochs)
+        weights = getattr(self, "weights", None)
+        batches = [data] if isinstance(data, tuple) else data
+
+        for x, y in batches:
+            if self._training_state is None:
+                self._training_state = _TrainingState(x.shape[1], dtype = dtype, weights = weights)
+
+            self._training_state.train(x, y, learning_rate = learning_rate, averaged = averaged)
+
+        if self._training_state is not None:
+            self.weights = self._training_state.get_weights(averaged)
 
     def predict(self, data, *evaluation_metrics):
         """
@@ -57,43 +148,501 @@ class Perceptron:
 
         return evaluate(labels, predictions, *evaluation_metrics)
 
+    def score(self, examples):
+        """
+        Scores the given examples without needing labels.
+
+        The examples can be a feature matrix, a single example, or a list of
+        examples and small batches such as the rows of several requests. A list
+        is combined into one CSR matrix so that every example is scored by a
+        single matrix-vector product.
+
+        :param examples: the examples to score
+
+        :return: a score for each example
+        """
 
-def _train(data, *, learning_rate, decay_learning_rate, averaged, epochs):
+        return _stack_examples(examples).dot(self.weights)
+
+    def classify(self, examples):
+        """
+        Classifies the given examples without needing labels.
+
+        :param examples: the examples to classify, in any form accepted by score
+
+        :return: a prediction for each example
+        """
+
+        return np.sign(self.score(examples))
+
+    def save(self, path):
+        """
+        Saves the weights of this perceptron to a directory.
+
+        :param path: the directory to save to
+        """
+
+        save_arrays(path, {"model": "Perceptron", "num_features": len(self.weights)}, weights = self.weights)
+
+    @classmethod
+    def load(cls, path, *, mmap = True):
+        """
+        Loads a perceptron saved with save.
+
+        :param path: the directory to load from
+        :param mmap: whether or not to memory map the weights read only (default True)
+
+        :return: the loaded perceptron
+        """
+
+        metadata, arrays = load_arrays(path, mmap = mmap)
+
+        if metadata["model"] != "Perceptron":
+            raise Exception(f"Cannot load a {metadata['model']} as a Perceptron")
+
+        model = cls()
+        model.weights = arrays["weights"]
+
+        return model
+
+
+class _TrainingState:
+    """
+    The weights and averaging state of a perceptron that is trained
+    incrementally.
+    """
+
+    def __init__(self, num_features, *, dtype = np.float64, weights = None):
+        """
+        :param num_features: the number of features
+        :param dtype: the type of new weights (default float64)
+        :param weights: weights to continue training from, which keep their type (default random weights)
+        """
+
+        if weights is None:
+            self.weights = np.array([random.uniform(-0.01, 0.01) for _ in range(num_features)], dtype = dtype)
+        elif len(weights) != num_features:
+            raise Exception(f"Expected {len(weights)} features, but got {num_features}")
+        else:
+            # loaded weights may be memory mapped read only
+            self.weights = np.array(weights)
+
+        self.update_totals = np.zeros(num_features)
+        self.example_count = 0
+
+        # the number of epochs trained by train, and what they were trained
+        # with, which decide whether a later call can warm start
+        self.epoch = 0
+        self.data = None
+        self.hyperparameters = None
+
+    def train(self, x, y, *, learning_rate, averaged):
+        """
+        Trains the weights with one pass over a batch of examples.
+
+        :param x: the features of the examples
+        :param y: the labels of the examples
+        :param learning_rate: the learning rate of the perceptron
+        :param averaged: whether or not update totals should be kept
+        """
+
+        if x.shape[1] != len(self.weights):
+            raise Exception(f"Expected {len(self.weights)} features, but got {x.shape[1]}")
+
+        from scipy.sparse import csr_matrix
+
+        x = _canonical_csr(csr_matrix(x))
+        order = np.array(shuffled_indices(len(y)), dtype = np.int64)
+
+        self.example_count, mistake_count = _train_epoch(x.indptr, x.indices, x.data, np.asarray(y), order,
+                                                         self.weights, self.update_totals,
+                                                         learning_rate, averaged, self.example_count)
+
+        instrumentation.count("perceptron.partial_fit.mistakes", mistake_count)
+
+    def get_weights(self, averaged):
+        """
+        Gets the weights to predict with.
+
+        :param averaged: use the average of all weights
+
+        :return: the weights to predict with
+        """
+
+        if averaged and self.example_count > 0:
+            average = _total_weights(self.weights, self.update_totals, self.example_count) / self.example_count
+            return average.astype(self.weights.dtype, copy = False)
+
+        return self.weights.copy()
+
+
+def _train(data, *, learning_rate, decay_learning_rate, averaged, epochs, n_jobs = 1, parallel = "hogwild", state = None,
+           dtype = np.float64):
     """
     Trains a perceptron using the given data.
 
+    When a training state is given, training continues from its epoch up to
+    the given number of epochs.
+
     :param data: the data to use in training
     :param learning_rate: the learning rate of the perceptron
     :param decay_learning_rate: whether or not to decay the learning rate with each epoch
     :param averaged: use the average of all weights
     :param epochs: the number of epochs to train for
+    :param n_jobs: the number of processes to train with
+    :param parallel: either "hogwild" or "mixing"
+    :param state: an optional training state to continue from
+    :param dtype: the type of the weights
+
+    :return: the trained weights
+    :return: the training state, or None when training in parallel
     """
 
+    if parallel not in ("hogwild", "mixing"):
+        raise Exception(f"Unrecognized parallel training mode: {parallel}")
+
     num_examples, num_features = data[0].shape
 
-    weights = np.array([random.uniform(-0.01, 0.01) for _ in range(num_features)])
-    total_weights = np.array([0.0 for _ in range(num_features)])
+    if n_jobs > 1:
+        weights = np.array([random.uniform(-0.01, 0.01) for _ in range(num_features)], dtype = dtype)
+        total_weights = _train_parallel(data, weights,
+                                        learning_rate = learning_rate,
+                                        averaged = averaged,
+                                        epochs = epochs,
+                                        n_jobs = n_jobs,
+                                        parallel = parallel)
+
+        if averaged:
+            return (total_weights / (num_examples * epochs)).astype(dtype, copy = False), None
+
+        return weights, None
+
+    if state is None:
+        state = _TrainingState(num_features, dtype = dtype)
+
+    if is_csr_matrix(data[0]):
+        _train_sparse(data, state,
+                      learning_rate = learning_rate,
+                      averaged = averaged,
+                      epochs = epochs)
+    else:
+        _train_dense(data, state,
+                     learning_rate = learning_rate,
+                     averaged = averaged,
+                     epochs = epochs)
+
+    return state.get_weights(averaged), state
+
+def _train_dense(data, state, *, learning_rate, averaged, epochs):
+    """
+    Trains a perceptron on dense data from the epoch of the given training
+    state, which is updated in place.
+
+    :param data: the data to use in training
+    :param state: the training state to continue from
+    :param learning_rate: the learning rate of the perceptron
+    :param averaged: use the average of all weights
+    :param epochs: the number of epochs to train up to
+    """
+
+    weights, update_totals = state.weights, state.update_totals
+
+    for epoch in range(state.epoch, epochs):
+        mistake_count = 0
 
-    for epoch in range(epochs):
         for example, label in enumerate_data(data):
             prediction = _predict(example, weights)
 
             if prediction != label:
                 addition = learning_rate / (1 + epoch) * label * example
+                mistake_count += 1
+
+                weights += addition
+                if averaged:
+                    update_totals += state.example_count * addition
+
+            state.example_count += 1
+
+        instrumentation.append("perceptron.epoch_mistakes", mistake_count)
+
+    state.epoch = max(state.epoch, epochs)
+
+def _train_sparse(data, state, *, learning_rate, averaged, epochs):
+    """
+    Trains a perceptron on CSR data from the epoch of the given training state,
+    which is updated in place.
+
+    Examples are read straight from the CSR arrays, so each prediction and
+    update only touches the weights of the features present in the example.
+    Each epoch is run by a compiled loop when numba is installed.
+
+    :param data: the data to use in training
+    :param state: the training state to continue from
+    :param learning_rate: the learning rate of the perceptron
+    :param averaged: use the average of all weights
+    :param epochs: the number of epochs to train up to
+    """
+
+    x, y = data
+    x = _canonical_csr(x)
+
+    for epoch in range(state.epoch, epochs):
+        order = np.array(shuffled_indices(len(y)), dtype = np.int64)
+
+        state.example_count, mistake_count = _train_epoch(x.indptr, x.indices, x.data, y, order,
+                                                          state.weights, state.update_totals,
+                                                          learning_rate / (1 + epoch), averaged, state.example_count)
 
-                # sparse matrices need to be converted to vectors
-                if isinstance(data[0], np.ndarray):
-                    weights = weights + addition
-                elif isinstance(data[0], csr_matrix):
-                    weights = weights + addition.toarray().reshape((num_features,))
+        instrumentation.append("perceptron.epoch_mistakes", mistake_count)
 
+    state.epoch = max(state.epoch, epochs)
+
+def _train_parallel(data, weights, *, learning_rate, averaged, epochs, n_jobs, parallel):
+    """
+    Trains a perceptron with several processes, updating the given weights in
+    place.
+
+    The examples and weights are kept in shared memory, and each epoch is split
+    into one shard of the shuffled examples per process.
+
+    With hogwild parallelism the processes update the shared weights without
+    locking, so when averaging each update is counted as if the shards had been
+    trained one after another. With mixing parallelism each process trains a
+    copy of the weights on its shard, and the copies are averaged after each
+    epoch.
+
+    :param data: the data to use in training
+    :param weights: the initial weights, which are updated in place
+    :param learning_rate: the learning rate of the perceptron
+    :param averaged: use the average of all weights
+    :param epochs: the number of epochs to train for
+    :param n_jobs: the number of processes to train with
+    :param parallel: either "hogwild" or "mixing"
+
+    :return: the sum of the weights after each example
+    """
+
+    from scipy.sparse import csr_matrix
+
+    x, y = data
+    x = _canonical_csr(csr_matrix(x))
+
+    num_examples = len(y)
+    total_weights = np.zeros(len(weights))
+
+    with SharedArrays() as shared:
+        shared.add("indptr", x.indptr)
+        shared.add("indices", x.indices)
+        shared.add("values", x.data)
+        shared.add("labels", y)
+
+        shared_weights = shared.add("weights", weights)
+        update_totals = shared.add("update_totals", np.zeros(len(weights)))
+
+        if parallel == "mixing":
+            worker_weights = shared.add("worker_weights", np.zeros((n_jobs, len(weights)), dtype = weights.dtype))
+            worker_totals = shared.add("worker_totals", np.zeros((n_jobs, len(weights))))
+
+        with multiprocessing.Pool(n_jobs, initializer = attach_shared_arrays, initargs = (shared.specs,)) as pool:
+            for epoch in range(epochs):
+                order = np.array(shuffled_indices(num_examples), dtype = np.int64)
+                shards = np.array_split(order, n_jobs)
+                epoch_learning_rate = learning_rate / (1 + epoch)
+
+                if parallel == "hogwild":
+                    example_counts = epoch * num_examples + np.cumsum([0] + [len(shard) for shard in shards[:-1]])
+                    mistake_counts = pool.starmap(_train_hogwild_shard,
+                                                  [(shard, epoch_learning_rate, averaged, int(example_count))
+                                                   for shard, example_count in zip(shards, example_counts)])
+                else:
+                    mistake_counts = pool.starmap(_train_mixing_shard, [(worker, shard, epoch_learning_rate, averaged)
+                                                                        for worker, shard in enumerate(shards)])
+
+                    shared_weights[:] = np.mean(worker_weights, axis = 0)
+                    total_weights += np.sum(worker_totals, axis = 0)
+
+                instrumentation.append("perceptron.epoch_mistakes", sum(mistake_counts))
+
+        weights[:] = shared_weights
+
+        if parallel == "hogwild":
+            total_weights = _total_weights(weights, update_totals, num_examples * epochs)
+
+    return total_weights
+
+def _train_hogwild_shard(order, learning_rate, averaged, example_count):
+    """
+    Trains the shared weights on a shard of the shared examples.
+
+    :param order: the examples of the shard, in the order to visit them
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+    :param example_count: the number of examples counted before this shard
+
+    :return: the number of mistakes made on the shard
+    """
+
+    arrays = get_shared_arrays()
+
+    _, mistake_count = _train_epoch(arrays["indptr"], arrays["indices"], arrays["values"], arrays["labels"], order,
+                                    arrays["weights"], arrays["update_totals"], learning_rate, averaged, example_count)
+
+    return mistake_count
+
+def _train_mixing_shard(worker, order, learning_rate, averaged):
+    """
+    Trains a copy of the shared weights on a shard of the shared examples.
+
+    The trained weights and the sum of the weights after each example of the
+    shard are written to the given worker's row of the shared worker arrays.
+
+    :param worker: the index of the worker training the shard
+    :param order: the examples of the shard, in the order to visit them
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+
+    :return: the number of mistakes made on the shard
+    """
+
+    arrays = get_shared_arrays()
+
+    weights = arrays["weights"].copy()
+    update_totals = np.zeros(len(weights))
+
+    example_count, mistake_count = _train_epoch(arrays["indptr"], arrays["indices"], arrays["values"], arrays["labels"],
+                                                order, weights, update_totals, learning_rate, averaged, 0)
+
+    arrays["worker_weights"][worker] = weights
+    arrays["worker_totals"][worker] = _total_weights(weights, update_totals, example_count)
+
+    return mistake_count
+
+def _canonical_csr(x):
+    """
+    Ensures that a CSR matrix has no repeated column indices in a row.
+
+    Repeated column indices would only be applied once by an indexed update, so
+    they need to be summed before training.
+
+    :param x: the CSR matrix
+
+    :return: the matrix, or a copy with its duplicates summed
+    """
+
+    if not x.has_canonical_format:
+        x = x.copy()
+        x.sum_duplicates()
+
+    return x
+
+def _train_epoch_numpy(indptr, indices, values, labels, order, weights, update_totals, learning_rate, averaged, example_count):
+    """
+    Runs one epoch of perceptron training over raw CSR arrays.
+
+    The weights and update totals are updated in place.
+
+    :param indptr: the CSR row pointers of the examples
+    :param indices: the CSR column indices of the examples
+    :param values: the CSR values of the examples
+    :param labels: the labels of the examples
+    :param order: the order to visit the examples in
+    :param weights: the weights to train
+    :param update_totals: the sum of each update scaled by the number of examples that preceded it
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+    :param example_count: the number of examples seen before this epoch
+
+    :return: the number of examples seen after this epoch
+    :return: the number of mistakes made in this epoch
+    """
+
+    mistake_count = 0
+
+    for index in order:
+        start, end = indptr[index], indptr[index + 1]
+        example_indices = indices[start:end]
+        example_values = values[start:end]
+
+        prediction = np.sign(example_values.dot(weights[example_indices]))
+
+        if prediction != labels[index]:
+            addition = learning_rate * labels[index] * example_values
+            mistake_count += 1
+
+            weights[example_indices] += addition
             if averaged:
-                total_weights = total_weights + weights
+                update_totals[example_indices] += example_count * addition
+
+        example_count += 1
+
+    return example_count, mistake_count
+
+def _train_epoch_compiled(indptr, indices, values, labels, order, weights, update_totals, learning_rate, averaged, example_count):
+    """
+    Runs one epoch of perceptron training over raw CSR arrays.
+
+    This is the same as _train_epoch_numpy, but is written with scalar loops so
+    that it can be compiled with numba.
+
+    :param indptr: the CSR row pointers of the examples
+    :param indices: the CSR column indices of the examples
+    :param values: the CSR values of the examples
+    :param labels: the labels of the examples
+    :param order: the order to visit the examples in
+    :param weights: the weights to train
+    :param update_totals: the sum of each update scaled by the number of examples that preceded it
+    :param learning_rate: the learning rate for this epoch
+    :param averaged: whether or not update totals should be kept
+    :param example_count: the number of examples seen before this epoch
+
+    :return: the number of examples seen after this epoch
+    :return: the number of mistakes made in this epoch
+    """
+
+    mistake_count = 0
+
+    for index in order:
+        start, end = indptr[index], indptr[index + 1]
+
+        score = 0.0
+        for position in range(start, end):
+            score += values[position] * weights[indices[position]]
+
+        if np.sign(score) != labels[index]:
+            scale = learning_rate * labels[index]
+            mistake_count += 1
+
+            for position in range(start, end):
+                addition = scale * values[position]
+
+                weights[indices[position]] += addition
+                if averaged:
+                    update_totals[indices[position]] += example_count * addition
+
+        example_count += 1
+
+    return example_count, mistake_count
+
+_train_epoch = compile_when_called(_train_epoch_compiled, _train_epoch_numpy)
+
+def _total_weights(weights, update_totals, example_count):
+    """
+    Determines the sum of the weights after each example without having
+    accumulated them.
 
-    if averaged:
-        return total_weights / (num_examples * epochs)
+    An update made after example_count previous examples is missing from the
+    weights of exactly those examples, so the sum of all weights is the final
+    weights once for every example, less each update scaled by the number of
+    examples that preceded it.
 
-    return weights
+    :param weights: the final weights
+    :param update_totals: the sum of each update scaled by the number of examples that preceded it
+    :param example_count: the number of examples seen
+
+    :return: the sum of the weights after each example
+    """
+
+    return example_count * weights - update_totals
 
 def _predict(example, weights):
     """
@@ -107,6 +656,39 @@ def _predict(example, weights):
 
     return np.sign(example.dot(weights))
 
+def _stack_examples(examples):
+    """
+    Combines a list of examples and batches into a single CSR matrix.
+
+    Anything that is not a list or tuple is returned as a matrix unchanged, and
+    a single vector is treated as one example.
+
+    :param examples: the examples to combine
+
+    :return: a matrix of the examples
+    """
+
+    if not isinstance(examples, (list, tuple)):
+        if isinstance(examples, np.ndarray) and examples.ndim == 1:
+            return examples.reshape((1, -1))
+
+        return examples
+
+    if len(examples) == 0:
+        raise Exception("There are no examples to combine")
+
+    from scipy.sparse import csr_matrix
+
+    matrices = [csr_matrix(example) for example in examples]
+
+    value_offsets = np.cumsum([0] + [matrix.nnz for matrix in matrices[:-1]])
+    indptr = np.concatenate([[0]] + [matrix.indptr[1:] + offset for matrix, offset in zip(matrices, value_offsets)])
+    indices = np.concatenate([matrix.indices for matrix in matrices])
+    values = np.concatenate([matrix.data for matrix in matrices])
+
+    shape = (len(indptr) - 1, matrices[0].shape[1])
+    return csr_matrix((values, indices, indptr), shape = shape)
+
 def enumerate_data(data):
     """
     Enumerates the given data in a random order.
@@ -115,9 +697,20 @@ def enumerate_data(data):
     """
 
     x, y = data
-    
-    indices = [index for index in range(len(y))]
-    random.shuffle(indices)
 
-    for index in indices:
+    for index in shuffled_indices(len(y)):
         yield x[index, :], y[index]
+
+def shuffled_indices(count):
+    """
+    Creates a list of the indices below count in a random order.
+
+    :param count: the number of indices
+
+    :return: the shuffled indices
+    """
+
+    indices = [index for index in range(count)]
+    random.shuffle(indices)
+
+    return indices
@@ -0,0 +1,45 @@
+import json
+import numpy as np
+import os
+
+
+def save_arrays(path, metadata, **arrays):
+    """
+    Saves model arrays and metadata to a directory.
+
+    Each array is written as its own .npy file so that it can be memory mapped
+    when loaded, and the metadata is written as JSON.
+
+    :param path: the directory to save to, which is created if needed
+    :param metadata: a JSON serializable dictionary describing the model
+    :param arrays: the arrays to save by name
+    """
+
+    os.makedirs(path, exist_ok = True)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(array))
+
+    metadata = dict(metadata, arrays = sorted(arrays))
+
+    with open(os.path.join(path, "metadata.json"), "w") as metadata_file:
+        json.dump(metadata, metadata_file)
+
+def load_arrays(path, *, mmap = True):
+    """
+    Loads model arrays and metadata saved by save_arrays.
+
+    :param path: the directory to load from
+    :param mmap: whether or not to memory map the arrays read only (default True)
+
+    :return: the metadata dictionary
+    :return: a dictionary of the arrays by name
+    """
+
+    with open(os.path.join(path, "metadata.json"), "r") as metadata_file:
+        metadata = json.load(metadata_file)
+
+    mmap_mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode = mmap_mode) for name in metadata["arrays"]}
+
+    return metadata, arrays
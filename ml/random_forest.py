@@ -0,0 +1,156 @@
+import math
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+import learnz.ml.decision_tree as decision_tree
+from learnz.ml.decision_tree import COUNT_METRICS, FlatTree, encode_data, entropy, id3_encoded
+from learnz.ml.evaluation import evaluate
+from learnz.ml.shared_memory import SharedArrays
+
+
+class RandomForest:
+    def __init__(self, label_name):
+        self.label_name = label_name
+
+    def train(self, data, *, tree_count = 10, max_depth = -1, metric = entropy, max_features = None,
+              numeric_feature_names = (), bins = 256, n_jobs = 1, seed = None):
+        """
+        Trains a random forest using the given data.
+
+        The data is encoded once and shared by every tree. Each tree is trained
+        on a bootstrap sample of the rows, and considers a random subset of the
+        features at each split.
+
+        :param data: the data to use in training
+        :param tree_count: the number of trees to train (default 10)
+        :param max_depth: the maximum depth of each tree, or -1 for no limit (default -1)
+        :param metric: the metric to use when calculating information gain, entropy or gini_index (default entropy)
+        :param max_features: the number of features to consider at each split (default the square root of the feature count)
+        :param numeric_feature_names: the names of features to split with thresholds (default none)
+        :param bins: the maximum number of bins for numeric features (default 256)
+        :param n_jobs: the number of processes to train trees with (default 1)
+        :param seed: the seed of the random samples (default None)
+        """
+
+        if metric not in COUNT_METRICS:
+            raise Exception("Random forests can only use metrics in COUNT_METRICS")
+
+        feature_names = [feature_name for feature_name in data.columns if feature_name != self.label_name]
+
+        if max_features is None:
+            max_features = max(1, round(math.sqrt(len(feature_names))))
+
+        encoded = encode_data(data, feature_names, self.label_name,
+                              numeric_feature_names = set(numeric_feature_names),
+                              bins = bins)
+
+        tree_seeds = np.random.SeedSequence(seed).spawn(tree_count)
+        tree_arguments = [(tree_seed, max_depth, COUNT_METRICS[metric], max_features) for tree_seed in tree_seeds]
+
+        if n_jobs > 1:
+            roots = _train_parallel(encoded, tree_arguments, n_jobs)
+        else:
+            roots = [_build_tree(encoded, *arguments) for arguments in tree_arguments]
+
+        self.classes = encoded.classes
+        self._trees = [FlatTree(root, encoded.classes) for root in roots]
+
+    def predict(self, data, *evaluation_metrics):
+        """
+        Make a prediction for each of the given examples by majority vote.
+
+        Ties go to the smallest label.
+
+        :param data: the data to predict
+        :param evaluation_metrics: an optional list of evaluation metrics to apply
+
+        :return: predictions for each example
+        """
+
+        votes = np.zeros(len(data) * len(self.classes), dtype = np.int64)
+        vote_offsets = np.arange(len(data)) * len(self.classes)
+
+        # every tree routes to indices in the classes of the forest
+        for tree in self._trees:
+            votes += np.bincount(vote_offsets + tree.route(data), minlength = len(votes))
+
+        votes = votes.reshape((len(data), len(self.classes)))
+        predictions = pd.Series(self.classes[np.argmax(votes, axis = 1)])
+
+        if len(evaluation_metrics) == 0:
+            return predictions
+
+        labels = data[self.label_name].reset_index(drop = True)
+
+        evaluations = evaluate(labels, predictions, *evaluation_metrics)
+        return predictions, evaluations
+
+    def evaluate(self, data, *evaluation_metrics):
+        """
+        Evaluates the model on the given examples with the provided metrics.
+
+        :param data: the data to predict
+        :param evaluation_metrics: a list of evaluation metrics to apply
+
+        :return: the results of the requested evaluations
+        """
+
+        predictions = self.predict(data)
+        labels = data[self.label_name].reset_index(drop = True)
+
+        return evaluate(labels, predictions, *evaluation_metrics)
+
+
+def _build_tree(encoded, tree_seed, max_depth, count_metric, max_features):
+    """
+    Builds one tree of a random forest.
+
+    The bootstrap sample is an array of row indices drawn with replacement, so
+    a row drawn more than once is simply counted more than once.
+
+    :param encoded: the encoded data
+    :param tree_seed: the seed sequence of the tree
+    :param max_depth: the maximum depth of the tree
+    :param count_metric: the metric to use when calculating information gain, calculated from label counts
+    :param max_features: the number of features to consider at each split
+
+    :return: the root of the tree
+    """
+
+    rng = np.random.default_rng(tree_seed)
+
+    row_count = len(encoded.labels)
+    rows = np.sort(rng.integers(0, row_count, row_count))
+    features = np.arange(len(encoded.feature_names))
+
+    return id3_encoded(encoded, rows, features, max_depth, count_metric, max_features = max_features, rng = rng)
+
+def _train_parallel(encoded, tree_arguments, n_jobs):
+    """
+    Builds the trees of a random forest with a pool of processes that share the
+    encoded data.
+
+    :param encoded: the encoded data
+    :param tree_arguments: the arguments of _build_tree for each tree, other than the data
+    :param n_jobs: the number of processes to train with
+
+    :return: the root of each tree
+    """
+
+    with SharedArrays() as shared:
+        shared.add("codes", encoded.codes)
+        shared.add("labels", encoded.labels)
+
+        initargs = (shared.specs, encoded.feature_names, encoded.categories, encoded.thresholds, encoded.classes)
+
+        with multiprocessing.Pool(n_jobs, initializer = decision_tree._attach_encoded_data, initargs = initargs) as pool:
+            return pool.starmap(_build_shared_tree, tree_arguments)
+
+def _build_shared_tree(*arguments):
+    """
+    Builds one tree of a random forest from the shared encoded data in a worker
+    process.
+    """
+
+    return _build_tree(decision_tree._worker_encoded, *arguments)
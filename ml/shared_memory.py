@@ -0,0 +1,152 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+from learnz.ml.lazy import is_csr_matrix
+
+
+class SharedArrays:
+    """
+    Keeps numpy arrays in shared memory so that worker processes can use them
+    without each task pickling a copy.
+
+    The specs of the arrays should be passed to attach_shared_arrays when a
+    worker process starts, after which the worker can find the arrays with
+    get_shared_arrays. The shared memory is released when the context exits.
+    """
+
+    def __init__(self):
+        self.specs = dict()
+        self.arrays = dict()
+
+        self._blocks = []
+
+    def add(self, name, array):
+        """
+        Copies an array into shared memory.
+
+        :param name: the name workers will use to find the array
+        :param array: the array to share
+
+        :return: the shared copy of the array
+        """
+
+        array = np.asarray(array)
+
+        # shared memory blocks cannot be empty
+        block = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+        self._blocks.append(block)
+
+        shared_array = np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)
+        shared_array[...] = array
+
+        self.specs[name] = (block.name, array.shape, array.dtype.str)
+        self.arrays[name] = shared_array
+
+        return shared_array
+
+    def close(self):
+        """
+        Releases the shared memory of every array.
+        """
+
+        self.arrays.clear()
+
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+        self._blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+_worker_blocks = []
+_worker_arrays = dict()
+
+def attach_shared_arrays(specs):
+    """
+    Attaches the arrays described by the given specs in a worker process.
+
+    This is intended to be used as the initializer of a process pool.
+
+    :param specs: the specs of a SharedArrays instance
+    """
+
+    _worker_arrays.clear()
+
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name = block_name)
+        _worker_blocks.append(block)
+
+        _worker_arrays[name] = np.ndarray(shape, dtype = np.dtype(dtype), buffer = block.buf)
+
+def get_shared_arrays():
+    """
+    Gets the arrays attached in this worker process.
+
+    :return: a dictionary of the attached arrays by name
+    """
+
+    return _worker_arrays
+
+def share_data(shared, data, name = "data"):
+    """
+    Shares a data set, as accepted by the models, with worker processes.
+
+    Numpy arrays and CSR matrices are copied into shared memory, and tuples are
+    shared element by element. Anything else, such as a data frame, is kept in
+    the description, so it is pickled once per worker rather than per task.
+
+    :param shared: the SharedArrays to add arrays to
+    :param data: the data to share
+    :param name: a name that is unique among the shared arrays
+
+    :return: a description of the data that can be passed to get_shared_data
+    """
+
+    if isinstance(data, tuple):
+        return ("tuple", [share_data(shared, subdata, f"{name}.{index}") for index, subdata in enumerate(data)])
+
+    if isinstance(data, np.ndarray):
+        shared.add(name, data)
+        return ("ndarray", name)
+
+    if is_csr_matrix(data):
+        shared.add(f"{name}.data", data.data)
+        shared.add(f"{name}.indices", data.indices)
+        shared.add(f"{name}.indptr", data.indptr)
+        return ("csr", name, data.shape)
+
+    return ("object", data)
+
+def get_shared_data(description):
+    """
+    Rebuilds data shared by share_data in a worker process, after its arrays
+    have been attached.
+
+    :param description: the description returned by share_data
+
+    :return: the shared data
+    """
+
+    kind = description[0]
+
+    if kind == "tuple":
+        return tuple(get_shared_data(subdescription) for subdescription in description[1])
+
+    if kind == "ndarray":
+        return _worker_arrays[description[1]]
+
+    if kind == "csr":
+        from scipy.sparse import csr_matrix
+
+        _, name, shape = description
+        arrays = (_worker_arrays[f"{name}.data"], _worker_arrays[f"{name}.indices"], _worker_arrays[f"{name}.indptr"])
+
+        return csr_matrix(arrays, shape = shape, copy = False)
+
+    return description[1]
@@ -0,0 +1,31 @@
+import random
+
+import numpy as np
+
+from learnz.benchmarks import generators
+from learnz.ml.data import hash_features, read_libsvm
+from learnz.ml.models import Perceptron
+
+
+def test_hash_features_matches_hashed_libsvm(tmp_path):
+    x, y = generators.sparse_classification(500, 200, 0.05)
+
+    path = tmp_path / "data.libsvm"
+    generators.write_libsvm(path, x, y)
+
+    x_read, y_read = read_libsvm(path, hash_bits = 8)
+    x_hashed = hash_features(x, 8)
+
+    assert x_hashed.shape == x_read.shape
+    np.testing.assert_allclose(x_hashed.toarray(), x_read.toarray(), atol = 1e-5)
+
+    random.seed(0)
+    model = Perceptron()
+    model.train((x_read, y_read), epochs = 2)
+
+    assert np.array_equal(model.classify(x_hashed), model.classify(x_read))
+
+def test_hash_features_without_bias():
+    x, _ = generators.sparse_classification(10, 50, 0.2)
+
+    assert hash_features(x, 4, append_bias = False).shape == (10, 16)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from learnz.ml.models import DecisionTree, RandomForest
+
+
+def missing_category_frame():
+    rng = np.random.default_rng(0)
+    row_count = 400
+
+    # the label depends most on b, so every b node splits on a, and a has
+    # missing values under each of them
+    a = rng.choice([1.0, 2.0, np.nan], row_count)
+    b = rng.choice(["p", "q", "r", "s"], row_count)
+    label = np.where(np.isnan(a), 2, np.where(a == 1.0, 0, 1)) + 3 * pd.factorize(b)[0]
+
+    return pd.DataFrame({"a": a, "b": b, "label": label})
+
+def test_decision_tree_predicts_missing_categories():
+    data = missing_category_frame()
+
+    model = DecisionTree("label")
+    model.train(data)
+    predictions = model.predict(data)
+
+    assert predictions.dtype == np.int64
+    assert np.array_equal(predictions.to_numpy(), data["label"].to_numpy())
+
+def test_random_forest_predicts_missing_categories():
+    data = missing_category_frame()
+
+    model = RandomForest("label")
+    model.train(data, tree_count = 5, max_features = 2, seed = 0)
+    predictions = model.predict(data)
+
+    assert predictions.dtype == np.int64
+    assert np.mean(predictions.to_numpy() == data["label"].to_numpy()) > 0.9
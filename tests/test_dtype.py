@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+
+from learnz.benchmarks import generators
+from learnz.ml import clustering
+from learnz.ml.models import Perceptron
+
+
+def test_float32_perceptron_matches_float64():
+    x, y = generators.sparse_classification(3000, 1000, 0.01)
+    train, test = slice(0, 2500), slice(2500, None)
+
+    for options in (dict(), dict(averaged = False)):
+        random.seed(0)
+        model_64 = Perceptron()
+        model_64.train((x[train], y[train]), **options)
+
+        random.seed(0)
+        model_32 = Perceptron()
+        model_32.train((x[train].astype(np.float32), y[train].astype(np.float32)), dtype = np.float32, **options)
+
+        assert model_32.weights.dtype == np.float32
+
+        predictions_64 = model_64.classify(x[test])
+        predictions_32 = model_32.classify(x[test].astype(np.float32))
+
+        assert np.mean(predictions_64 == predictions_32) >= 0.99
+
+def test_float32_kmeans_pp_matches_float64():
+    data = generators.blobs(2000, 4, 5)
+
+    random.seed(1)
+    clusters_64, centers_64 = clustering.kmeans_pp(data, 5, return_centers = True)
+
+    random.seed(1)
+    clusters_32, centers_32 = clustering.kmeans_pp(data, 5, return_centers = True, dtype = np.float32)
+
+    assert all(center.dtype == np.float32 for center in centers_32)
+    assert [len(cluster) for cluster in clusters_32] == [len(cluster) for cluster in clusters_64]
+    np.testing.assert_allclose(np.array(centers_32), np.array(centers_64), rtol = 1e-4, atol = 1e-4)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from learnz.ml.evaluation import (ConfusionMatrix, accuracy, error, evaluate, fscore_on, macro_fscore, precision_on,
+                                  recall_on)
+
+
+LABELS_AND_PREDICTIONS = {
+    "nan": (np.array([1.0, np.nan, 2.0, np.nan, 1.0]), np.array([1.0, np.nan, 1.0, 2.0, np.nan])),
+    "object": (pd.Series(["a", "b", None, "a", None]), pd.Series(["a", "a", "b", None, None])),
+    "object_nan": (pd.Series(["a", np.nan, "b", np.nan], dtype = object), pd.Series(["a", np.nan, "a", "b"], dtype = object))
+}
+
+@pytest.mark.parametrize("name", LABELS_AND_PREDICTIONS)
+def test_evaluate_matches_metrics(name):
+    labels, predictions = LABELS_AND_PREDICTIONS[name]
+    metrics = [accuracy, error, precision_on(labels[0]), recall_on(labels[0]), fscore_on(labels[0])]
+
+    # several confusion metrics share a confusion matrix
+    shared = evaluate(labels, predictions, *metrics)
+    direct = [metric(labels, predictions) for metric in metrics]
+
+    assert shared == pytest.approx(direct)
+    assert evaluate(labels, predictions, accuracy) == pytest.approx([accuracy(labels, predictions)])
+
+@pytest.mark.parametrize("name", LABELS_AND_PREDICTIONS)
+def test_merged_confusion_matrix_matches_concatenated(name):
+    labels, predictions = LABELS_AND_PREDICTIONS[name]
+    labels, predictions = np.asarray(labels), np.asarray(predictions)
+
+    merged = ConfusionMatrix.from_predictions(labels[:2], predictions[:2])
+    merged.update(labels[2:], predictions[2:])
+
+    assert merged.evaluate(accuracy, macro_fscore) == pytest.approx([accuracy(labels, predictions),
+                                                                      macro_fscore(labels, predictions)])